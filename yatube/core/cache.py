@@ -0,0 +1,419 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import timing
+
+EPOCH_KEY = "two-tier:epoch"
+JOURNAL_KEY = "two-tier:journal:{}"
+CLEAR_ALL = "*"
+# SQLite до 3.32 принимает не больше 999 параметров в одном запросе.
+MAX_QUERY_PARAMS = 900
+
+
+class TwoTierCache(BaseCache):
+    """Двухуровневый кеш: маленький LRU в процессе поверх общего кеша.
+
+    L1 живёт в памяти процесса, ограничен LOCAL_MAX_ENTRIES записями и
+    LOCAL_TIMEOUT секундами. L2 — любой настроенный кеш Django из
+    OPTIONS["SHARED"], общий для всех процессов (файловый, БД, ...).
+
+    Каждая перезапись или удаление добавляет изменённые ключи в журнал в L2
+    и увеличивает номер эпохи. Процессы не чаще SYNC_INTERVAL секунд
+    сверяют эпоху и выбрасывают из L1 ключи, изменённые в других
+    процессах; при пропуске журнала L1 очищается целиком.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED", location)
+        self._local_max_entries = options.get("LOCAL_MAX_ENTRIES", 1000)
+        self._local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self._sync_interval = options.get("SYNC_INTERVAL", 1)
+        self._journal_length = options.get("JOURNAL_LENGTH", 1000)
+        self._journal_timeout = options.get("JOURNAL_TIMEOUT", 60 * 10)
+        self._local = OrderedDict()
+        self._lock = threading.RLock()
+        self._epoch = None
+        self._synced_at = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # L1
+
+    def _local_get(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            expires, pickled = item
+            if expires <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return pickled
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        expires = self.get_backend_timeout(timeout)
+        # get_backend_timeout возвращает момент истечения, а не срок.
+        timeout = None if expires is None else expires - time.time()
+        if timeout is not None and timeout <= 0:
+            return self._local_drop([key])
+        if timeout is None or timeout > self._local_timeout:
+            timeout = self._local_timeout
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[key] = (time.monotonic() + timeout, pickled)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_drop(self, keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    # Журнал инвалидаций
+
+    def _publish(self, keys):
+        shared = self.shared
+        try:
+            epoch = shared.incr(EPOCH_KEY)
+        except ValueError:
+            shared.add(EPOCH_KEY, 0, None)
+            epoch = shared.incr(EPOCH_KEY)
+        # Старые записи журнала истекают сами; процесс, который отстал
+        # сильнее, не найдёт их и очистит L1 целиком.
+        shared.set(
+            JOURNAL_KEY.format(epoch), list(keys), self._journal_timeout
+        )
+        with self._lock:
+            if self._epoch == epoch - 1:
+                # Своё изменение L1 уже учёл: журнал читать не нужно.
+                self._epoch = epoch
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        self._synced_at = now
+        shared = self.shared
+        epoch = shared.get(EPOCH_KEY, 0)
+        with self._lock:
+            seen = self._epoch
+            if epoch == seen:
+                return
+            if seen is None or epoch < seen:
+                self._local.clear()
+                self._epoch = epoch
+                return
+        if epoch - seen > self._journal_length:
+            changed = None
+        else:
+            journal_keys = [
+                JOURNAL_KEY.format(number)
+                for number in range(seen + 1, epoch + 1)
+            ]
+            entries = shared.get_many(journal_keys)
+            if len(entries) < len(journal_keys):
+                changed = None
+            else:
+                changed = [key for keys in entries.values() for key in keys]
+        with self._lock:
+            if changed is None or CLEAR_ALL in changed:
+                self._local.clear()
+            else:
+                self._local_drop(changed)
+            self._epoch = epoch
+
+    # API кеша Django
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._sync()
+        pickled = self._local_get(key)
+        if pickled is not None:
+            timing.record_cache(1)
+            return pickle.loads(pickled)
+        value = self.shared.get(key, self, version=None)
+        if value is self:
+            timing.record_cache(0, 1)
+            return default
+        timing.record_cache(1)
+        self._local_set(key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missing = {}
+        for key in keys:
+            made = self.make_key(key, version=version)
+            self.validate_key(made)
+            pickled = self._local_get(made)
+            if pickled is not None:
+                found[key] = pickle.loads(pickled)
+            else:
+                missing[made] = key
+        requested = len(found) + len(missing)
+        if missing:
+            for made, value in self.shared.get_many(missing).items():
+                self._local_set(made, value)
+                found[missing[made]] = value
+        timing.record_cache(len(found), requested - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.shared.set(key, value, self._shared_timeout(timeout))
+        self._publish([key])
+        self._local_set(key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        made = {}
+        for key, value in data.items():
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = value
+        failed = self.shared.set_many(made, self._shared_timeout(timeout))
+        self._publish(made)
+        for made_key, value in made.items():
+            self._local_set(made_key, value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        added = self.shared.add(key, value, self._shared_timeout(timeout))
+        if added:
+            # Ключа в L2 не было: в чужих L1 его нет или он доживает
+            # последние LOCAL_TIMEOUT секунд, поэтому журнал не нужен.
+            # Так чтения, которые заводят поколения и блокировки, ничего
+            # не публикуют.
+            self._local_set(key, value, timeout)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self.shared.incr(key, delta)
+        self._local_drop([key])
+        self._publish([key])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.shared.touch(key, self._shared_timeout(timeout))
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.shared.delete(key)
+        self._local_drop([key])
+        self._publish([key])
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        self.shared.delete_many(made)
+        self._local_drop(made)
+        self._publish(made)
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._local.clear()
+        self._publish([CLEAR_ALL])
+
+    def _shared_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return timeout
+
+
+class SQLiteCache(BaseCache):
+    """Общий кеш в файле SQLite для нескольких процессов на одной машине.
+
+    В отличие от FileBasedCache запись не перебирает все ключи: одна
+    строка в таблице с первичным ключом. Просроченные и лишние записи
+    вычищаются раз в CULL_EVERY записей, а не на каждой.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._cull_every = params.get("OPTIONS", {}).get("CULL_EVERY", 1000)
+        self._writes = 0
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _write(self):
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull()
+
+    def _cull(self):
+        with self._write() as db:
+            db.execute("DELETE FROM cache WHERE expires <= ?", [time.time()])
+            (count,) = db.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if count > self._max_entries:
+                # Первыми уходят записи, которые раньше всех истекут.
+                db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                    "ORDER BY expires IS NULL, expires LIMIT ?)",
+                    [count // self._cull_frequency or 1],
+                )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _live(self, db, key):
+        row = db.execute(
+            "SELECT value, expires FROM cache WHERE key = ?", [key]
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0]
+
+    def get(self, key, default=None, version=None):
+        value = self._live(self._db, self._key(key, version))
+        return default if value is None else pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        keys = list(made)
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), MAX_QUERY_PARAMS):
+            chunk = keys[start:start + MAX_QUERY_PARAMS]
+            rows = self._db.execute(
+                "SELECT key, value, expires FROM cache WHERE key IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update(
+                (made[key], pickle.loads(value))
+                for key, value, expires in rows
+                if expires is None or expires > now
+            )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (
+                self._key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires,
+            )
+            for key, value in data.items()
+        ]
+        with self._write() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            if self._live(db, key) is not None:
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                [
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self.get_backend_timeout(timeout),
+                ],
+            )
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        made = self._key(key, version)
+        with self._write() as db:
+            value = self._live(db, made)
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(value) + delta
+            db.execute(
+                "UPDATE cache SET value = ? WHERE key = ?",
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), made],
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            if self._live(db, key) is None:
+                return False
+            db.execute(
+                "UPDATE cache SET expires = ? WHERE key = ?",
+                [self.get_backend_timeout(timeout), key],
+            )
+        return True
+
+    def has_key(self, key, version=None):
+        return self._live(self._db, self._key(key, version)) is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made = [(self._key(key, version),) for key in keys]
+        with self._write() as db:
+            db.executemany("DELETE FROM cache WHERE key = ?", made)
+
+    def clear(self):
+        with self._write() as db:
+            db.execute("DELETE FROM cache")
@@ -0,0 +1,28 @@
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+HOLE_MARKER = "<!--hole:{}-->"
+
+
+def punch_holes(request):
+    """Просит шаблоны оставить метки вместо персональных фрагментов."""
+    request.punch_holes = True
+
+
+def hole_marker(template_name):
+    return HOLE_MARKER.format(escape(template_name))
+
+
+def fill_holes(response, request, template_names):
+    """Дорисовывает персональные фрагменты в общую закешированную страницу."""
+    content = response.content.decode(response.charset)
+    filled = content
+    for template_name in template_names:
+        marker = hole_marker(template_name)
+        if marker in filled:
+            filled = filled.replace(
+                marker, render_to_string(template_name, request=request)
+            )
+    if filled is not content:
+        response.content = filled
+    return response
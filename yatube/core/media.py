@@ -0,0 +1,123 @@
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, quote_etag
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Имена из хеша содержимого: такой файл по этому адресу не изменится.
+IMMUTABLE_NAME_RE = re.compile(r"(?:^|/)[0-9a-f]{32,64}\.\w+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+MUTABLE_CACHE = "public, max-age=3600"
+
+
+class RangeFile:
+    """Файл, из которого читается только диапазон байтов."""
+
+    def __init__(self, file, start, length, block_size=64 * 1024):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+        self.block_size = block_size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Диапазон (start, end) включительно из заголовка Range.
+
+    None — отдать файл целиком (заголовка нет, он не разобран или
+    просит несколько диапазонов); False — диапазон вне файла.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def etag_for(stat):
+    return quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+
+
+def cache_headers(response, name, stat):
+    immutable = IMMUTABLE_NAME_RE.search(name)
+    response["Cache-Control"] = IMMUTABLE_CACHE if immutable else MUTABLE_CACHE
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["ETag"] = etag_for(stat)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def offload(name, full_path, content_type):
+    """Ответ, который передаёт файл фронт-серверу, или None без него.
+
+    Путь в заголовке экранируется как URL: иначе Django закодирует
+    не-ASCII имя по RFC 2047, и фронт-сервер файл не найдёт. nginx и
+    mod_xsendfile раскодируют его сами.
+    """
+    mode = settings.MEDIA_SENDFILE
+    if mode is None:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if mode == "nginx":
+        path = settings.MEDIA_ACCEL_PREFIX + name
+        response["X-Accel-Redirect"] = quote(path)
+    elif mode == "apache":
+        response["X-Sendfile"] = quote(full_path)
+    else:
+        raise ValueError(f"Неизвестный MEDIA_SENDFILE: {mode}")
+    return response
+
+
+def file_response(request, full_path, stat, content_type):
+    """FileResponse с поддержкой одного диапазона байтов."""
+    size = stat.st_size
+    byte_range = None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range is None or if_range == etag_for(stat):
+        byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    file = open(full_path, "rb")
+    if byte_range is None:
+        # Целиком файл уходит через wsgi.file_wrapper, то есть sendfile.
+        response = FileResponse(file, content_type=content_type)
+        response["Content-Length"] = size
+        return response
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(
+        RangeFile(file, start, length), status=206, content_type=content_type
+    )
+    response["Content-Length"] = length
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def guess_type(name):
+    content_type, _ = mimetypes.guess_type(name)
+    return content_type or "application/octet-stream"
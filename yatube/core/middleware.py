@@ -0,0 +1,77 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import timing
+
+logger = logging.getLogger("core.timing")
+
+
+class ServerTimingMiddleware:
+    """Считает SQL, шаблоны и кеш каждого запроса.
+
+    Итог уходит в заголовок Server-Timing (его показывают инструменты
+    разработчика браузера) и одной строкой key=value в логгер
+    core.timing. Учёт — несколько вызовов perf_counter на запрос,
+    поэтому его можно не выключать на боевом сервере.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = timing.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            timing.finish(token)
+        total = timings.total_time
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = server_timing_header(timings, total)
+        logger.info(
+            "%s %s status=%s total_ms=%.1f sql_count=%d sql_ms=%.1f "
+            "template_ms=%.1f cache_hits=%d cache_misses=%d",
+            request.method,
+            request.path,
+            response.status_code,
+            total * 1000,
+            timings.sql_count,
+            timings.sql_time * 1000,
+            timings.template_time * 1000,
+            timings.cache_hits,
+            timings.cache_misses,
+            extra={
+                "server_timing": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "total_ms": total * 1000,
+                    "sql_count": timings.sql_count,
+                    "sql_ms": timings.sql_time * 1000,
+                    "template_ms": timings.template_time * 1000,
+                    "cache_hits": timings.cache_hits,
+                    "cache_misses": timings.cache_misses,
+                }
+            },
+        )
+        return response
+
+
+def server_timing_header(timings, total):
+    return ", ".join(
+        (
+            f'db;dur={timings.sql_time * 1000:.1f};'
+            f'desc="{timings.sql_count} queries"',
+            f"tpl;dur={timings.template_time * 1000:.1f}",
+            f'cache;desc="{timings.cache_hits} hits, '
+            f'{timings.cache_misses} misses"',
+            f"total;dur={total * 1000:.1f}",
+        )
+    )
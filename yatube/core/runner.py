@@ -0,0 +1,28 @@
+from unittest import TextTestResult
+
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class CacheResetRunner(DiscoverRunner):
+    """Запускает тесты, очищая кеши после каждого теста.
+
+    Тест откатывает базу, а кеш остаётся: без очистки следующий тест
+    увидит чужие страницы, поколения и записи sorl о миниатюрах, строк
+    и файлов которых уже нет.
+    """
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or TextTestResult
+
+        class CacheResetResult(base):
+            def stopTest(self, test):
+                clear_caches()
+                super().stopTest(test)
+
+        return CacheResetResult
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import re
+import threading
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(
+    r"^(?:.+/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$"
+)
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла, прочитанного кусками."""
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под SHA-256 содержимого: `posts/ab/cd/<sha256>.jpg`.
+
+    Одинаковые загрузки сохраняются один раз, а двухуровневое
+    разбиение по префиксу хеша держит каталоги небольшими. Сколько
+    записей ссылается на файл, считает вызывающий код.
+    """
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        if self.is_hashed(name):
+            # Повторное сохранение под готовым именем не вкладывает
+            # каталоги хеша друг в друга.
+            directory = os.path.dirname(os.path.dirname(directory))
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(
+            directory, digest[:2], digest[2:4], f"{digest}{extension}"
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saving = threading.local()
+
+    def get_available_name(self, name, max_length=None):
+        if name == getattr(self._saving, "name", None):
+            # FileSystemStorage._save повторяет запись под этим именем и
+            # без исключения крутился бы вечно: имя не меняется.
+            raise FileExistsError(name)
+        # Имя всё равно заменится хешем в `_save`.
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        self._saving.name = name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            # Такой же файл успела записать параллельная загрузка.
+            return name
+        finally:
+            self._saving.name = None
+
+    def is_hashed(self, name):
+        return bool(HASHED_NAME.match(name))
@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name):
+    """Персональный фрагмент, который не попадает в общий кеш страницы.
+
+    На кешируемых страницах выводит метку, которую кеш заменяет
+    фрагментом текущего пользователя; на остальных — сам фрагмент.
+    """
+    request = context.get("request")
+    if getattr(request, "punch_holes", False):
+        return mark_safe(hole_marker(template_name))
+    return context.template.engine.get_template(template_name).render(context)
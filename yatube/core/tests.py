@@ -1,4 +1,23 @@
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import timing
+from core.cache import EPOCH_KEY, SQLiteCache, TwoTierCache
+from core.storage import ContentAddressedStorage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = f"posts/ab/cd/{'ab' * 32}.txt"
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +25,248 @@ class ViewTestClass(TestCase):
         response = self.client.get("/nonexist-page/")
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+class TwoTierCacheTest(TestCase):
+    def make_cache(self):
+        return TwoTierCache(
+            "",
+            {
+                "KEY_PREFIX": "two-tier-test",
+                "OPTIONS": {"SHARED": "shared", "SYNC_INTERVAL": 0},
+            },
+        )
+
+    def setUp(self):
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+        self.first.clear()
+
+    def test_local_copy_is_used(self):
+        """Прочитанное значение дальше берётся из памяти процесса."""
+        self.first.set("key", "value")
+        self.assertEqual(self.second.get("key"), "value")
+        self.second.shared.delete(self.second.make_key("key"))
+        self.assertEqual(self.second.get("key"), "value")
+
+    def test_write_invalidates_other_process(self):
+        """Запись в одном процессе сбрасывает копию в другом."""
+        self.first.set("key", 1)
+        self.assertEqual(self.second.get("key"), 1)
+        self.first.set("key", 2)
+        self.assertEqual(self.second.get("key"), 2)
+        self.first.incr("key")
+        self.assertEqual(self.second.get("key"), 3)
+        self.first.delete("key")
+        self.assertIsNone(self.second.get("key"))
+
+    def test_clear_invalidates_other_process(self):
+        self.first.set_many({"a": 1, "b": 2})
+        self.assertEqual(self.second.get_many(["a", "b"]), {"a": 1, "b": 2})
+        self.first.clear()
+        self.assertEqual(self.second.get_many(["a", "b"]), {})
+
+    def test_add_does_not_publish(self):
+        """Новые ключи при чтении не пишут журнал инвалидаций."""
+        epoch = self.first.shared.get(EPOCH_KEY)
+        self.assertTrue(self.first.add("fresh", 1))
+        self.assertEqual(self.first.shared.get(EPOCH_KEY), epoch)
+        self.assertEqual(self.second.get("fresh"), 1)
+
+    def test_local_tier_is_bounded(self):
+        cache = TwoTierCache(
+            "",
+            {"OPTIONS": {"SHARED": "shared", "LOCAL_MAX_ENTRIES": 2}},
+        )
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+        self.assertEqual(len(cache._local), 2)
+        self.assertEqual(cache.get("a"), "a")
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.cache = SQLiteCache(
+            os.path.join(directory, "cache.sqlite3"),
+            {"OPTIONS": {"MAX_ENTRIES": 10, "CULL_EVERY": 5}},
+        )
+
+    def test_basic_operations(self):
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(self.cache.get("key"), {"value": 1})
+        self.assertFalse(self.cache.add("key", 2))
+        self.assertTrue(self.cache.add("other", 2))
+        self.assertEqual(self.cache.incr("other", 3), 5)
+        self.assertEqual(
+            self.cache.get_many(["key", "other", "missing"]),
+            {"key": {"value": 1}, "other": 5},
+        )
+        self.cache.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+        self.assertFalse(self.cache.has_key("key"))
+        with self.assertRaises(ValueError):
+            self.cache.incr("key")
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(["other"]), {})
+
+    def test_get_many_fits_old_sqlite_limit(self):
+        """Длинный get_many не упирается в 999 параметров старого SQLite."""
+        if hasattr(self.cache._db, "setlimit"):
+            self.cache._db.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        keys = [f"key-{number}" for number in range(1500)]
+        self.cache.set_many(dict.fromkeys(keys, 1))
+        self.assertEqual(len(self.cache.get_many(keys)), 1500)
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set("key", 1, 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.add("key", 2))
+        self.assertEqual(self.cache.get("key"), 2)
+
+    def test_cull_keeps_size_bounded(self):
+        """Лишние записи вычищаются раз в CULL_EVERY записей."""
+        for number in range(30):
+            self.cache.set(f"key-{number}", number)
+        (count,) = self.cache._db.execute(
+            "SELECT COUNT(*) FROM cache"
+        ).fetchone()
+        self.assertLessEqual(count, 15)
+        self.assertEqual(self.cache.get("key-29"), 29)
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=directory)
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("posts/a.txt", ContentFile(b"data"))
+        second = self.storage.save("posts/b.TXT", ContentFile(b"data"))
+        self.assertEqual(first, second)
+        self.assertTrue(self.storage.is_hashed(first))
+
+    def test_concurrent_upload_of_same_file(self):
+        """Файл, записанный параллельно, не зацикливает сохранение."""
+        name = self.storage.save("posts/a.txt", ContentFile(b"data"))
+        with mock.patch.object(self.storage, "exists", return_value=False):
+            saved = self.storage.save("posts/a.txt", ContentFile(b"data"))
+        self.assertEqual(saved, name)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b"data")
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ("posts/plain.txt", HASHED_NAME, "posts/фото 1.txt"):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(b"0123456789")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_whole_file(self):
+        response = self.client.get("/media/posts/plain.txt")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+    def test_byte_ranges(self):
+        """Диапазоны отдаются кусками, невыполнимые — с кодом 416."""
+        cases = {
+            "bytes=2-4": (206, b"234", "bytes 2-4/10"),
+            "bytes=7-": (206, b"789", "bytes 7-9/10"),
+            "bytes=-2": (206, b"89", "bytes 8-9/10"),
+        }
+        for header, (status, body, content_range) in cases.items():
+            with self.subTest(header=header):
+                response = self.client.get(
+                    "/media/posts/plain.txt", HTTP_RANGE=header
+                )
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(b"".join(response.streaming_content), body)
+                self.assertEqual(response["Content-Range"], content_range)
+        response = self.client.get(
+            "/media/posts/plain.txt", HTTP_RANGE="bytes=20-"
+        )
+        self.assertEqual(response.status_code, 416)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.client.get(f"/media/{HASHED_NAME}")
+        self.assertIn("immutable", response["Cache-Control"])
+        response = self.client.get(
+            f"/media/{HASHED_NAME}", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(MEDIA_SENDFILE="nginx")
+    def test_transfer_is_offloaded(self):
+        """С фронт-сервером Django отдаёт только заголовок."""
+        response = self.client.get("/media/posts/plain.txt")
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/posts/plain.txt"
+        )
+        self.assertEqual(response.content, b"")
+
+    @override_settings(MEDIA_SENDFILE="nginx")
+    def test_offloaded_path_is_quoted(self):
+        """Не-ASCII имя уходит фронт-серверу экранированным, как в URL."""
+        response = self.client.get("/media/posts/фото 1.txt")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/protected-media/posts/%D1%84%D0%BE%D1%82%D0%BE%201.txt",
+        )
+
+    def test_missing_and_outside_files(self):
+        for url in ("/media/posts/none.txt", "/media/posts/", "/media/../x"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ServerTimingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_header_and_log(self):
+        """Ответ несёт счётчики запроса в заголовке и в логе."""
+        with self.assertLogs("core.timing", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/about/author/")
+        header = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', header)
+        self.assertRegex(header, r"tpl;dur=\d+\.\d")
+        self.assertIn("total;dur=", header)
+        record = logs.records[0]
+        self.assertEqual(record.server_timing["status"], 200)
+        self.assertEqual(record.server_timing["sql_count"], len(queries))
+        self.assertGreater(record.server_timing["template_ms"], 0)
+
+    def test_cache_hits_and_misses(self):
+        cache.set("warm", 1)
+        timings, token = timing.start()
+        try:
+            cache.get("warm")
+            cache.get("cold")
+            cache.get_many(["warm", "cold", "other"])
+        finally:
+            timing.finish(token)
+        self.assertEqual((timings.cache_hits, timings.cache_misses), (2, 3))
+        # Вне запроса учёт не ведётся.
+        cache.get("warm")
+        self.assertEqual(timings.cache_hits, 2)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get("/about/author/")
+        self.assertNotIn("Server-Timing", response)
@@ -0,0 +1,89 @@
+import time
+from contextvars import ContextVar
+
+from django.template.backends import django as django_backend
+
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Счётчики одного запроса: SQL, шаблоны и кеш."""
+
+    __slots__ = (
+        "started",
+        "sql_count",
+        "sql_time",
+        "template_time",
+        "template_depth",
+        "cache_hits",
+        "cache_misses",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    """Начинает учёт запроса; возвращает счётчики и токен для finish."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_cache(hits, misses=0):
+    timings = _current.get()
+    if timings is not None:
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        # Вложенные render_to_string уже входят во время внешнего шаблона.
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(django_backend.DjangoTemplates):
+    """Шаблонизатор Django, который учитывает время отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
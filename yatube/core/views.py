@@ -1,4 +1,15 @@
+import os
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from .media import cache_headers, etag_for, file_response, guess_type, offload
 
 
 def page_not_found(request, exception):
@@ -15,3 +26,31 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=""):
     return render(request, "core/403csrf.html")
+
+
+@require_safe
+def media(request, path):
+    """Отдаёт загруженный файл: через фронт-сервер или FileResponse.
+
+    Картинки постов видны всем, поэтому права доступа не проверяются;
+    закрытым файлам понадобится проверка до offload.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, "/")
+    response = get_conditional_response(
+        request,
+        etag=etag_for(file_stat),
+        last_modified=int(file_stat.st_mtime),
+    )
+    if response is None:
+        content_type = guess_type(name)
+        response = offload(name, full_path, content_type) or file_response(
+            request, full_path, file_stat, content_type
+        )
+    return cache_headers(response, name, file_stat)
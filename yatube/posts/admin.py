@@ -1,5 +1,7 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -16,6 +18,22 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ("group",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу вместо icontains по всей таблице.
+        if not search.terms(search_term):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        queryset, truncated = search.filter_queryset(queryset, search_term)
+        if truncated:
+            self.message_user(
+                request,
+                "Показаны только {} лучших совпадений, уточните "
+                "запрос.".format(settings.POSTS_SEARCH_ADMIN_LIMIT),
+                messages.WARNING,
+            )
+        return queryset, False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
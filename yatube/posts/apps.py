@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = "posts"
+
+    def ready(self):
+        from django.conf import settings
+
+        from PIL import Image
+
+        from . import signals  # noqa: F401
+
+        # Тот же предел защищает от бомб-декомпрессий и sorl-thumbnail.
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
@@ -0,0 +1,136 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.urls import reverse
+
+from .cache import bump_generation, get_generation
+from .models import Group, User
+
+SCOPE = "autocomplete"
+# Символ больше любого в ключах: граница диапазона для префикса.
+HIGH = "\U0010ffff"
+
+
+class PrefixIndex:
+    """Отсортированный список ключей в памяти процесса.
+
+    Ключ — (строка в нижнем регистре, вид, id). Поиск по префиксу — два
+    bisect и срез, без обращений к базе. Индекс загружается при первом
+    запросе, сигналы сохранения правят его на месте, а чужие изменения
+    приходят через поколение SCOPE: если другой процесс его увеличил,
+    индекс перечитывается.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = None
+        self._entries = {}
+        self._generation = None
+
+    def _load(self):
+        generation = get_generation(SCOPE)
+        keys = []
+        entries = {}
+        users = User.objects.values_list("pk", "username")
+        for pk, username in users.iterator():
+            entries[("user", pk)] = (username, (username,))
+        groups = Group.objects.values_list("pk", "title", "slug")
+        for pk, title, slug in groups.iterator():
+            entries[("group", pk)] = (title, (title, slug))
+        for (kind, pk), (_, words) in entries.items():
+            keys.extend((word.casefold(), kind, pk) for word in words)
+        keys.sort()
+        self._keys, self._entries = keys, entries
+        self._generation = generation
+
+    def _ensure_loaded(self):
+        generation = get_generation(SCOPE)
+        with self._lock:
+            if self._keys is None or self._generation != generation:
+                self._load()
+
+    def _forget(self, kind, pk):
+        _, words = self._entries.pop((kind, pk), (None, ()))
+        for word in words:
+            key = (word.casefold(), kind, pk)
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def _remember(self, kind, pk, label, words):
+        self._entries[(kind, pk)] = (label, words)
+        for word in words:
+            insort(self._keys, (word.casefold(), kind, pk))
+
+    def update(self, kind, pk, label=None, words=()):
+        """Заменяет записи объекта; без `words` — удаляет их."""
+        seen = get_generation(SCOPE)
+        with self._lock:
+            if self._entries.get((kind, pk)) == (label, tuple(words)):
+                return
+            if self._keys is not None:
+                self._forget(kind, pk)
+                if words:
+                    self._remember(kind, pk, label, tuple(words))
+        bump_generation(SCOPE)
+        generation = get_generation(SCOPE)
+        with self._lock:
+            # Своё изменение уже в индексе; если между чтениями поколения
+            # вклинился другой процесс, при следующем запросе перечитаем.
+            if self._generation == seen and generation == seen + 1:
+                self._generation = generation
+
+    def complete(self, prefix, limit=None):
+        """Объекты, у которых имя, название или слаг начинаются с prefix."""
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        if limit is None:
+            limit = settings.AUTOCOMPLETE_LIMIT
+        self._ensure_loaded()
+        with self._lock:
+            start = bisect_left(self._keys, (prefix,))
+            stop = bisect_left(self._keys, (prefix + HIGH,), start)
+            found = []
+            for position in range(start, stop):
+                _, kind, pk = self._keys[position]
+                if (kind, pk) not in found:
+                    found.append((kind, pk))
+                    if len(found) == limit:
+                        break
+            return [
+                (kind, pk, *self._entries[(kind, pk)]) for kind, pk in found
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._keys = None
+            self._entries = {}
+            self._generation = None
+
+
+index = PrefixIndex()
+
+
+def suggestions(prefix, limit=None):
+    """Подсказки для поля поиска: вид, подпись и адрес страницы."""
+    result = []
+    for kind, pk, label, words in index.complete(prefix, limit):
+        if kind == "user":
+            url = reverse("posts:profile", args=[words[0]])
+        else:
+            url = reverse("posts:group_list", args=[words[1]])
+        result.append({"type": kind, "label": label, "url": url})
+    return result
+
+
+def user_changed(user, update_fields=None):
+    # Вход пользователя сохраняет только last_login: индекс не меняется.
+    if update_fields is not None and "username" not in update_fields:
+        return
+    index.update("user", user.pk, user.username, (user.username,))
+
+
+def group_changed(group):
+    index.update("group", group.pk, group.title, (group.title, group.slug))
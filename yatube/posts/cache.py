@@ -0,0 +1,342 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from core.holes import fill_holes, punch_holes
+
+from .models import Comment, Follow, Post
+
+GENERATION_KEY = "posts:generation:{}"
+PAGE_KEY = "posts:page:{}:{}"
+LOCK_KEY = "{}:lock"
+FENCE_KEY = "posts:page_fence"
+STATS_KEY = "posts:page_stats:{}"
+STATS_EVENTS = ("hit", "stale", "recompute")
+# Персональные фрагменты, которые не попадают в общий кеш страниц.
+PAGE_HOLES = ("includes/header.html",)
+
+
+def _new_generation():
+    # Время в наносекундах больше любого ранее выданного поколения,
+    # поэтому вытесненный из кеша счётчик не вернёт старые страницы.
+    return time.time_ns()
+
+
+def _generation_key(scope):
+    # Слаги и имена пользователей бывают не-ASCII: в ключ идёт их хеш.
+    return GENERATION_KEY.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def get_generation(scope):
+    """Текущее поколение данных для области `scope`."""
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(*scopes):
+    """Делает устаревшими все кешированные страницы областей."""
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def post_scopes(post, group_slug=None):
+    """Области, страницы которых показывают пост."""
+    scopes = ["index", f"profile:{post.author.username}"]
+    if post.group_id is not None:
+        scopes.append(f"group:{post.group.slug}")
+    if group_slug is not None:
+        scopes.append(f"group:{group_slug}")
+    return scopes
+
+
+def follower_scopes(author_id):
+    """Области лент подписок всех подписчиков автора."""
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        "user_id", flat=True
+    )
+    return [f"follow:{user_id}" for user_id in followers.iterator()]
+
+
+def page_key(scope, request, per_user=False):
+    if not request.user.is_authenticated:
+        viewer = "anon"
+    elif per_user:
+        viewer = request.user.pk
+    else:
+        viewer = "auth"
+    page = hashlib.md5(
+        f"{scope}:{request.get_full_path()}".encode()
+    ).hexdigest()
+    return PAGE_KEY.format(page, viewer)
+
+
+class _Stats:
+    """Счётчики событий кеша страниц в памяти процесса.
+
+    Попадание — самый частый путь, поэтому счёт не пишет в общий кеш на
+    каждый запрос: события копятся здесь и сбрасываются в кеш не чаще
+    раза в FEED_CACHE_STATS_FLUSH_INTERVAL секунд.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flushed_at = time.monotonic()
+
+    def count(self, event):
+        with self.lock:
+            self.pending[event] += 1
+            due = (
+                time.monotonic() - self.flushed_at
+                >= settings.FEED_CACHE_STATS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        return pending
+
+    def flush(self):
+        for event, value in self.take().items():
+            key = STATS_KEY.format(event)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+
+_stats = _Stats()
+
+
+def _count(event):
+    _stats.count(event)
+
+
+def flush_cache_stats():
+    """Переносит накопленные в процессе счётчики в общий кеш."""
+    _stats.flush()
+
+
+def get_cache_stats():
+    """Счётчики попаданий, устаревших ответов и пересчётов страниц.
+
+    Включают ещё не сброшенные события этого процесса; другие процессы
+    видны с задержкой до FEED_CACHE_STATS_FLUSH_INTERVAL секунд.
+    """
+    keys = {STATS_KEY.format(event): event for event in STATS_EVENTS}
+    values = cache.get_many(keys)
+    with _stats.lock:
+        pending = dict(_stats.pending)
+    return {
+        event: values.get(key, 0) + pending.get(event, 0)
+        for key, event in keys.items()
+    }
+
+
+def reset_cache_stats():
+    _stats.take()
+    cache.delete_many([STATS_KEY.format(event) for event in STATS_EVENTS])
+
+
+def _acquire_lock(key):
+    """Берёт блокировку пересчёта: (владелец, fencing-токен) или None.
+
+    Сначала блокировка, потом токен: запросы, которые её не взяли и
+    отдают старую копию, не пишут в общий кеш ничего, кроме одного add.
+    """
+    owner = uuid.uuid4().hex
+    timeout = settings.FEED_CACHE_LOCK_TIMEOUT
+    if not cache.add(LOCK_KEY.format(key), owner, timeout):
+        return None
+    try:
+        fence = cache.incr(FENCE_KEY)
+    except ValueError:
+        cache.add(FENCE_KEY, _new_generation(), None)
+        fence = cache.incr(FENCE_KEY)
+    return owner, fence
+
+
+def _release_lock(key, owner):
+    lock_key = LOCK_KEY.format(key)
+    if cache.get(lock_key) == owner:
+        cache.delete(lock_key)
+
+
+def _store(key, fence, generation, response):
+    # Воркер, чья блокировка истекла, не перезапишет результат того,
+    # кто взял блокировку позже: у него fencing-токен больше.
+    current = cache.get(key)
+    if current is not None and current["fence"] > fence:
+        return
+    entry = {
+        "generation": generation,
+        "fresh_until": time.time() + settings.FEED_CACHE_TIMEOUT,
+        "fence": fence,
+        "content": response.content,
+        "content_type": response["Content-Type"],
+    }
+    timeout = settings.FEED_CACHE_TIMEOUT + settings.FEED_CACHE_STALE_TIMEOUT
+    cache.set(key, entry, timeout)
+
+
+def _from_entry(entry):
+    return HttpResponse(entry["content"], content_type=entry["content_type"])
+
+
+def cached_response(key, generation, compute):
+    """Ответ из кеша с stale-while-revalidate и единственным пересчётом.
+
+    Свежая запись отдаётся сразу. Устаревшую пересчитывает только тот
+    запрос, который взял блокировку; остальные получают старую версию.
+    """
+    entry = cache.get(key)
+    if (
+        entry is not None
+        and entry["generation"] == generation
+        and entry["fresh_until"] > time.time()
+    ):
+        _count("hit")
+        return _from_entry(entry)
+    lock = _acquire_lock(key)
+    if lock is None and entry is not None:
+        _count("stale")
+        return _from_entry(entry)
+    _count("recompute")
+    if lock is None:
+        # Копии нет совсем: считаем страницу, но не спорим за запись.
+        return compute()
+    owner, fence = lock
+    try:
+        response = compute()
+        if response.status_code == 200 and not response.streaming:
+            _store(key, fence, generation, response)
+    finally:
+        _release_lock(key, owner)
+    return response
+
+
+def cache_feed(scope, per_user=False):
+    """Кеширует страницу ленты до изменения её поколения.
+
+    `scope` — имя области или функция от аргументов view, которая его
+    возвращает. Сигналы Post и Comment увеличивают поколение области,
+    поэтому страницы живут FEED_CACHE_TIMEOUT, но не отстают от базы.
+
+    Тело страницы общее для всех анонимов и отдельно для всех вошедших;
+    шапка с именем пользователя дорисовывается в каждый ответ. Страницы,
+    тело которых зависит от пользователя, кешируются с `per_user=True`.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            name = scope(*args, **kwargs) if callable(scope) else scope
+            punch_holes(request)
+            try:
+                response = cached_response(
+                    page_key(name, request, per_user),
+                    get_generation(name),
+                    lambda: view(request, *args, **kwargs),
+                )
+            except Exception:
+                # Страницу 404 или 500 рисует Django, а не этот декоратор:
+                # фрагменты в ней должны отрисоваться сразу.
+                request.punch_holes = False
+                raise
+            if not response.streaming:
+                fill_holes(response, request, PAGE_HOLES)
+            patch_vary_headers(response, ("Cookie",))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _viewer(request):
+    return request.user.pk if request.user.is_authenticated else "anon"
+
+
+def feed_etag(scope):
+    """ETag страницы ленты из поколения её области — без запросов к БД."""
+
+    def etag(request, *args, **kwargs):
+        name = scope(*args, **kwargs) if callable(scope) else scope
+        raw = ":".join(
+            str(part)
+            for part in (
+                name,
+                get_generation(name),
+                _viewer(request),
+                request.get_full_path(),
+            )
+        )
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    return etag
+
+
+def _post_state(request, post_id):
+    # ETag и Last-Modified страницы поста считаются одним запросом.
+    if not hasattr(request, "post_state"):
+        last_comment = (
+            Comment.objects.filter(post=OuterRef("pk"))
+            .order_by("-created")
+            .values("created")[:1]
+        )
+        request.post_state = (
+            Post.objects.filter(pk=post_id)
+            .annotate(last_comment=Subquery(last_comment))
+            .values(
+                "updated_at", "last_comment", "author__profile__posts_count"
+            )
+            .first()
+        )
+    return request.post_state
+
+
+def post_last_modified(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    return max(filter(None, (state["updated_at"], state["last_comment"])))
+
+
+def post_etag(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    raw = ":".join(
+        str(part)
+        for part in (
+            post_id,
+            state["updated_at"].isoformat(),
+            state["last_comment"],
+            state["author__profile__posts_count"],
+            _viewer(request),
+        )
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -0,0 +1,58 @@
+from django.db.models import Count, F
+
+from .models import Follow, Post, Profile
+
+
+def count_for(user_ids):
+    """Точные значения счётчиков для пачки пользователей."""
+    counts = {
+        user_id: {
+            "posts_count": 0,
+            "followers_count": 0,
+            "following_count": 0,
+        }
+        for user_id in user_ids
+    }
+    grouped = (
+        (Post.objects, "author_id", "posts_count"),
+        (Follow.objects, "author_id", "followers_count"),
+        (Follow.objects, "user_id", "following_count"),
+    )
+    for manager, column, field in grouped:
+        rows = (
+            manager.filter(**{f"{column}__in": user_ids})
+            .order_by()
+            .values_list(column)
+            .annotate(total=Count("pk"))
+        )
+        for user_id, total in rows:
+            counts[user_id][field] = total
+    return counts
+
+
+def recount(user_id):
+    """Пересчитывает профиль одного пользователя."""
+    profile, _ = Profile.objects.update_or_create(
+        user_id=user_id, defaults=count_for([user_id])[user_id]
+    )
+    return profile
+
+
+def bump(user_id, field, delta):
+    """Атомарно сдвигает счётчик профиля на `delta`."""
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f"{field}__gte": -delta})
+    updated = profiles.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        # Профиля ещё нет: создаём его сразу с точными значениями.
+        recount(user_id)
+
+
+def get_profile(user):
+    """Профиль пользователя; отсутствующий создаётся пересчётом."""
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        user.profile = recount(user.pk)
+        return user.profile
@@ -0,0 +1,122 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post
+
+AUTHOR_TIMELINE_KEY = "posts:author_timeline:{}"
+
+
+def index_feed():
+    return Post.objects.select_related("author", "group")
+
+
+def group_feed(group):
+    return group.posts.select_related("author")
+
+
+def profile_feed(author):
+    return author.posts.select_related("group")
+
+
+def post_comments(post):
+    return post.comments.select_related("author")
+
+
+def join_feed(user):
+    """Лента подписок через join Post ⨝ Follow на каждый запрос."""
+    return Post.objects.filter(author__following__user=user).select_related(
+        "author", "group"
+    )
+
+
+def timeline_feed(user):
+    """Лента подписок из материализованной таблицы TimelineEntry."""
+    return (
+        Post.objects.filter(timeline_entries__user=user)
+        .order_by("-timeline_entries__pub_date")
+        .select_related("author", "group")
+    )
+
+
+def get_author_timelines(author_ids):
+    """Кешированные списки (pub_date, id) последних постов авторов."""
+    keys = {AUTHOR_TIMELINE_KEY.format(pk): pk for pk in author_ids}
+    timelines = cache.get_many(keys)
+    missing = {}
+    length = settings.AUTHOR_TIMELINE_LENGTH
+    for key, author_id in keys.items():
+        if key in timelines:
+            continue
+        missing[key] = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by("-pub_date", "-pk")
+            .values_list("pub_date", "pk")[:length]
+        )
+    if missing:
+        cache.set_many(missing, settings.AUTHOR_TIMELINE_TIMEOUT)
+        timelines.update(missing)
+    return list(timelines.values())
+
+
+def invalidate_author_timeline(author_id):
+    cache.delete(AUTHOR_TIMELINE_KEY.format(author_id))
+
+
+class MergedFeed:
+    """Лента, собираемая k-way слиянием списков постов авторов.
+
+    Ведёт себя как последовательность для Paginator: считает длину без
+    запросов к базе и при срезе загружает только попавшие в него посты.
+    """
+
+    def __init__(self, timelines):
+        self.timelines = timelines
+
+    def count(self):
+        return sum(len(timeline) for timeline in self.timelines)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        merged = heapq.merge(*self.timelines, reverse=True)
+        ids = [pk for _, pk in islice(merged, index.start, index.stop)]
+        posts = Post.objects.select_related("author", "group").in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def merge_feed(user):
+    """Лента подписок слиянием кешированных лент авторов (pull-модель)."""
+    author_ids = Follow.objects.filter(user=user).values_list(
+        "author_id", flat=True
+    )
+    return MergedFeed(get_author_timelines(author_ids))
+
+
+FOLLOW_FEED_ENGINES = {
+    "join": join_feed,
+    "timeline": timeline_feed,
+    "merge": merge_feed,
+}
+
+
+# Поля, по которым курсорная пагинация листает ленту подписок.
+FOLLOW_FEED_CURSOR_KEYS = {
+    "join": ("pub_date", "pk"),
+    "timeline": ("timeline_entries__pub_date", "timeline_entries__post_id"),
+}
+
+
+def get_follow_feed(user):
+    return FOLLOW_FEED_ENGINES[settings.FOLLOW_FEED_ENGINE](user)
+
+
+def get_follow_cursor_keys():
+    return FOLLOW_FEED_CURSOR_KEYS.get(
+        settings.FOLLOW_FEED_ENGINE, ("pub_date", "pk")
+    )
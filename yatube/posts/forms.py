@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import normalize_upload
 from .models import Comment, Post
 
 
@@ -8,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ("text", "group", "image")
 
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if isinstance(image, UploadedFile):
+            # В хранилище попадает только уменьшенная копия без EXIF.
+            return normalize_upload(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
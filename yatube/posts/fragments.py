@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .thumbnails import attach_thumbnails
+
+ARTICLE_KEY = "posts:article:{}:{}"
+ARTICLE_TEMPLATE = "includes/article.html"
+
+
+def article_stamp(post):
+    """Версия фрагмента: меняется вместе с любым показанным в нём полем."""
+    fields = (
+        post.text,
+        post.image.name,
+        str(post.thumbnails_ready),
+        post.image_variants,
+        post.pub_date.isoformat(),
+        post.author.username,
+        post.author.get_full_name(),
+    )
+    return hashlib.md5("\x1f".join(fields).encode()).hexdigest()
+
+
+def attach_articles(posts):
+    """Проставляет постам готовый HTML `includes/article.html`.
+
+    Все фрагменты страницы читаются одним get_many, а недостающие
+    рендерятся и сохраняются одним set_many. Миниатюры для них
+    подгружаются заранее одной пачкой.
+    """
+    posts = list(posts)
+    keys = {
+        ARTICLE_KEY.format(post.pk, article_stamp(post)): post
+        for post in posts
+    }
+    cached = cache.get_many(keys)
+    attach_thumbnails(
+        post for key, post in keys.items() if key not in cached
+    )
+    missing = {}
+    for key, post in keys.items():
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render_to_string(
+                ARTICLE_TEMPLATE, {"post": post}
+            )
+        post.article_html = mark_safe(html)
+    if missing:
+        cache.set_many(missing, settings.ARTICLE_CACHE_TIMEOUT)
+    return posts
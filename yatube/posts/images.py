@@ -0,0 +1,143 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from PIL import Image, ImageOps, ImageSequence
+
+# Форматы, которые сохраняются как есть; остальные перекодируются.
+KEPT_FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif"}
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif"}
+
+
+def read_size(upload):
+    """Размер картинки из заголовка файла, без декодирования пикселей."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        return image.format, image.size
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+
+def _target_format(image):
+    if image.format in KEPT_FORMATS:
+        return image.format
+    return "PNG" if _has_alpha(image) else "JPEG"
+
+
+def _decode(image, max_side):
+    """Декодирует картинку сразу в уменьшенном виде, если формат умеет."""
+    scale = max_side / max(image.size)
+    if scale < 1:
+        # JPEG-декодер сам уменьшает в 2, 4 или 8 раз, не собирая
+        # полный кадр в памяти; другие форматы draft игнорируют.
+        image.draft(
+            "RGB", (int(image.width * scale), int(image.height * scale))
+        )
+    ratio = max(image.size) // max_side
+    if ratio >= 2:
+        if image.mode in ("P", "1"):
+            # reduce не работает с палитрой и однобитными картинками.
+            image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+        image = image.reduce(ratio)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    # Поворот по EXIF делаем на уже уменьшенной копии.
+    return ImageOps.exif_transpose(image)
+
+
+def _save_animation(source, max_side, output):
+    """Уменьшает каждый кадр анимированного GIF и сохраняет их все."""
+    scale = min(1, max_side / max(source.size))
+    size = (
+        max(1, round(source.width * scale)),
+        max(1, round(source.height * scale)),
+    )
+    if size[0] * size[1] * source.n_frames > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Анимация слишком большая: не больше %(limit)s мегапикселей "
+            "во всех кадрах.",
+            code="image_too_large",
+            params={"limit": settings.IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(source):
+        durations.append(frame.info.get("duration", 100))
+        frames.append(frame.convert("RGBA").resize(size, Image.LANCZOS))
+    frames[0].save(
+        output,
+        "GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=source.info.get("loop", 0),
+        disposal=2,
+    )
+
+
+def _save_still(source, target, output):
+    image = _decode(source, settings.IMAGE_MAX_SIDE)
+    # reduce и exif_transpose переносят info, а кодировщик PNG берёт
+    # оттуда EXIF, если его не передали явно.
+    image.info.pop("exif", None)
+    options = {}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    if target == "JPEG":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        options.update(quality=settings.IMAGE_JPEG_QUALITY, optimize=True)
+    elif target == "GIF" and "transparency" in image.info:
+        options["transparency"] = image.info["transparency"]
+    image.save(output, target, **options)
+
+
+def normalize_upload(upload):
+    """Проверяет загруженную картинку и возвращает уменьшенную копию.
+
+    Размеры проверяются по заголовку до декодирования. Картинка
+    уменьшается до IMAGE_MAX_SIDE по большей стороне и сохраняется
+    заново — без EXIF и прочих метаданных, кроме цветового профиля.
+    """
+    image_format, (width, height) = read_size(upload)
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Картинка слишком большая: не больше %(limit)s мегапикселей.",
+            code="image_too_large",
+            params={"limit": settings.IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    upload.seek(0)
+    try:
+        source = Image.open(upload)
+        target = _target_format(source)
+        output = BytesIO()
+        if getattr(source, "is_animated", False) and target == "GIF":
+            if max(source.size) <= settings.IMAGE_MAX_SIDE:
+                # Анимация помещается в предел: файл сохраняется как есть.
+                upload.seek(0)
+                return upload
+            _save_animation(source, settings.IMAGE_MAX_SIDE, output)
+        else:
+            _save_still(source, target, output)
+    except (
+        OSError,
+        ValueError,
+        SyntaxError,
+        Image.DecompressionBombError,
+    ) as error:
+        # Заголовок прочитался, а пиксели — нет: файл битый или такой
+        # режим Pillow обработать не умеет.
+        raise ValidationError(
+            "Не удалось обработать картинку.", code="invalid_image"
+        ) from error
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f"{name}.{KEPT_FORMATS[target]}",
+        output.getvalue(),
+        content_type=CONTENT_TYPES[target],
+    )
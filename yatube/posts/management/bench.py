@@ -0,0 +1,5 @@
+def percentile(samples, percent):
+    """Перцентиль по ближайшему рангу; statistics.quantiles есть не везде."""
+    ordered = sorted(samples)
+    index = max(0, round(len(ordered) * percent / 100) - 1)
+    return ordered[index]
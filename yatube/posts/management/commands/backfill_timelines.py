@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts import timelines
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = "Заполняет материализованные ленты по существующим подпискам."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Заполнить ленту только этого пользователя."
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить записи лент перед заполнением.",
+        )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by("pk")
+        entries = TimelineEntry.objects.all()
+        if options["user"]:
+            follows = follows.filter(user__username=options["user"])
+            entries = entries.filter(user__username=options["user"])
+        if options["clear"]:
+            entries.delete()
+        pairs = follows.values_list("user_id", "author_id")
+        done = 0
+        for user_id, author_id in pairs.iterator():
+            timelines.add_author(user_id, author_id)
+            done += 1
+            if done % 1000 == 0:
+                self.stdout.write(f"Обработано подписок: {done}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово, обработано подписок: {done}")
+        )
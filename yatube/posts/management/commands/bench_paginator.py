@@ -0,0 +1,60 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+
+from posts.paginators import ElidedPaginator
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает отрисовку пагинатора со всеми номерами страниц и со "
+        "свёрнутым списком: время и размер HTML."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            nargs="+",
+            default=[10, 1000, 10000, 100000],
+            help="Число страниц в ленте для каждого замера.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Сколько раз отрисовать пагинатор на каждый замер.",
+        )
+
+    def handle(self, *args, **options):
+        template = get_template("posts/includes/paginator.html")
+        per_page = settings.POSTS_PER_PAGE
+        for num_pages in options["pages"]:
+            # range умеет len() и срезы: COUNT(*) и выборки не нужны.
+            paginator = ElidedPaginator(range(num_pages * per_page), per_page)
+            page_obj = paginator.page(num_pages // 2 or 1)
+            ranges = {
+                "все": paginator.page_range,
+                "свёрнутые": list(
+                    paginator.get_elided_page_range(
+                        page_obj.number,
+                        on_each_side=settings.POSTS_PAGE_RANGE_ON_EACH_SIDE,
+                        on_ends=settings.POSTS_PAGE_RANGE_ON_ENDS,
+                    )
+                ),
+            }
+            for name, page_range in ranges.items():
+                context = {"page_obj": page_obj, "page_range": page_range}
+                samples = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    html = template.render(context)
+                    samples.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{num_pages:>7} стр., {name:>9}: "
+                    f"{statistics.median(samples):8.2f} мс, "
+                    f"{len(html.encode()) / 1024:9.1f} КБ"
+                )
@@ -0,0 +1,164 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.management.bench import percentile
+from posts.search import _fts_query, terms
+
+VOCABULARY_SIZE = 20000
+WORDS_PER_POST = 40
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку поиска на синтетической базе: FTS5, обратный "
+        "индекс и LIKE по тексту. База создаётся во временном файле и "
+        "не трогает данные проекта."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts",
+            type=int,
+            default=1_000_000,
+            help="Сколько постов сгенерировать.",
+        )
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=200,
+            help="Сколько запросов выполнить на каждый способ.",
+        )
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=50,
+            help="Целевая задержка p95 в миллисекундах.",
+        )
+        parser.add_argument(
+            "--skip-like",
+            action="store_true",
+            help="Не замерять LIKE: на миллионе постов это долго.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        # Частоты слов по Ципфу, как в живом тексте.
+        self.vocabulary = [
+            f"слово{number}" for number in range(VOCABULARY_SIZE)
+        ]
+        self.weights = [1 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, "bench.sqlite3"))
+            try:
+                db.execute(
+                    "CREATE VIRTUAL TABLE post_fts USING fts5("
+                    "text, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+            except sqlite3.OperationalError:
+                raise CommandError("SQLite собран без FTS5.")
+            self.fill(db, options["posts"])
+            queries = [self.make_query() for _ in range(options["queries"])]
+            methods = [("fts5", self.fts5), ("inverted", self.inverted)]
+            if not options["skip_like"]:
+                methods.append(("like", self.like))
+            failed = False
+            for name, method in methods:
+                samples = []
+                for query in queries:
+                    started = time.perf_counter()
+                    method(db, query)
+                    samples.append((time.perf_counter() - started) * 1000)
+                p95 = percentile(samples, 95)
+                ok = p95 <= options["target_ms"]
+                failed |= name != "like" and not ok
+                line = (
+                    f"{name:>9}: p50 {statistics.median(samples):.1f} мс, "
+                    f"p95 {p95:.1f} мс"
+                )
+                style = self.style.SUCCESS if ok else self.style.WARNING
+                self.stdout.write(style(line))
+            db.close()
+        if failed:
+            raise CommandError(
+                f"Индексный поиск не уложился в p95 {options['target_ms']} мс."
+            )
+
+    def make_text(self):
+        return " ".join(
+            self.random.choices(
+                self.vocabulary, self.weights, k=WORDS_PER_POST
+            )
+        )
+
+    def make_query(self):
+        # Одно-два слова из «средней» части словаря: не стоп-слова,
+        # но и не уникальные.
+        return " ".join(
+            self.vocabulary[self.random.randrange(10, 2000)]
+            for _ in range(self.random.randint(1, 2))
+        )
+
+    def fill(self, db, count):
+        db.execute("CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT)")
+        db.execute(
+            "CREATE TABLE term (term TEXT, post_id INTEGER, weight INTEGER, "
+            "UNIQUE (term, post_id))"
+        )
+        started = time.perf_counter()
+        batch_size = 10000
+        for start in range(1, count + 1, batch_size):
+            rows = [
+                (pk, self.make_text())
+                for pk in range(start, min(start + batch_size, count + 1))
+            ]
+            db.executemany("INSERT INTO post VALUES (?, ?)", rows)
+            db.executemany(
+                "INSERT INTO post_fts (rowid, text) VALUES (?, ?)", rows
+            )
+            db.executemany(
+                "INSERT INTO term VALUES (?, ?, ?)",
+                (
+                    (term, pk, weight)
+                    for pk, text in rows
+                    for term, weight in Counter(terms(text)).items()
+                ),
+            )
+        db.commit()
+        self.stdout.write(
+            f"Сгенерировано постов: {count} "
+            f"за {time.perf_counter() - started:.0f} с"
+        )
+
+    def fts5(self, db, query):
+        return db.execute(
+            "SELECT rowid, rank FROM post_fts WHERE post_fts MATCH ? "
+            "ORDER BY rank, rowid LIMIT 11",
+            [_fts_query(terms(query))],
+        ).fetchall()
+
+    def inverted(self, db, query):
+        words = sorted(set(terms(query)))
+        placeholders = ", ".join("?" * len(words))
+        return db.execute(
+            "SELECT post_id, -SUM(weight) AS rank FROM term "
+            f"WHERE term IN ({placeholders}) GROUP BY post_id "
+            "HAVING COUNT(term) = ? ORDER BY rank, post_id LIMIT 11",
+            [*words, len(words)],
+        ).fetchall()
+
+    def like(self, db, query):
+        # Так искала админка: icontains по каждому слову.
+        words = terms(query)
+        where = " AND ".join("text LIKE ?" for _ in words)
+        return db.execute(
+            f"SELECT id FROM post WHERE {where} ORDER BY id DESC LIMIT 11",
+            [f"%{word}%" for word in words],
+        ).fetchall()
@@ -0,0 +1,103 @@
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+
+from PIL import Image
+from posts.images import normalize_upload
+
+
+def _peak_rss_mb():
+    # ru_maxrss переживает exec и достался бы от родителя, поэтому
+    # в Linux берём пик текущего процесса из /proc.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пиковую память при обработке загрузки: полное "
+        "декодирование против normalize_upload. Каждый замер идёт "
+        "в отдельном процессе, чтобы пики не смешивались."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--megapixels",
+            type=int,
+            default=24,
+            help="Размер тестовой JPEG-картинки, как у фотокамеры.",
+        )
+        parser.add_argument(
+            "--child",
+            choices=("full", "normalize"),
+            help="Служебный режим: обработать файл --path и вывести JSON.",
+        )
+        parser.add_argument("--path", help="Служебный: путь к картинке.")
+
+    def handle(self, *args, **options):
+        if options["child"]:
+            return self.measure(options["child"], options["path"])
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as photo:
+            self.make_photo(photo, options["megapixels"])
+            for mode in ("full", "normalize"):
+                result = json.loads(
+                    subprocess.run(
+                        [
+                            sys.executable,
+                            sys.argv[0],
+                            "bench_uploads",
+                            "--child",
+                            mode,
+                            "--path",
+                            photo.name,
+                        ],
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    ).stdout
+                )
+                self.stdout.write(
+                    f"{mode:>9}: пик RSS {result['peak']:.0f} МБ "
+                    f"(+{result['peak'] - result['baseline']:.0f} МБ), "
+                    f"{result['width']}x{result['height']}"
+                )
+
+    def make_photo(self, photo, megapixels):
+        width = int((megapixels * 10 ** 6 * 3 / 2) ** 0.5)
+        height = width * 2 // 3
+        Image.linear_gradient("L").resize((width, height)).convert(
+            "RGB"
+        ).save(photo, "JPEG", quality=90)
+        photo.flush()
+
+    def measure(self, mode, path):
+        with open(path, "rb") as source:
+            upload = SimpleUploadedFile("photo.jpg", source.read())
+        baseline = _peak_rss_mb()
+        if mode == "full":
+            # Так обрабатывал загрузку sorl-thumbnail до нормализации.
+            image = Image.open(upload)
+            image.load()
+        else:
+            image = Image.open(normalize_upload(upload))
+        self.stdout.write(
+            json.dumps(
+                {
+                    "baseline": baseline,
+                    "peak": _peak_rss_mb(),
+                    "width": image.width,
+                    "height": image.height,
+                }
+            )
+        )
@@ -0,0 +1,181 @@
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from posts.management.bench import percentile
+from posts.models import Comment, Follow, Group, Post, User
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку (p50/p95/p99) и пропускную способность "
+        "основных страниц на текущих данных. Запросы идут через "
+        "тестовый клиент Django в одном потоке, без веб-сервера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=100,
+            help="Сколько запросов сделать к каждой странице.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=5,
+            help="Сколько запросов сделать до замера.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Очищать кеш перед каждым запросом.",
+        )
+        parser.add_argument(
+            "--user",
+            help="Кем входить на страницы для вошедших; по умолчанию "
+            "пользователь с наибольшим числом подписок.",
+        )
+        parser.add_argument(
+            "--view",
+            action="append",
+            dest="views",
+            help="Замерить только эту страницу (можно повторять).",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("Нужно хотя бы два запроса на страницу.")
+        if not Post.objects.exists():
+            raise CommandError("Постов нет: сначала запустите seed_yatube.")
+        if settings.DEBUG:
+            self.stdout.write(
+                self.style.WARNING(
+                    "DEBUG включён: Django запоминает каждый SQL-запрос, "
+                    "цифры будут хуже боевых."
+                )
+            )
+        self.stdout.write(
+            f"Данные: пользователей {User.objects.count()}, "
+            f"постов {Post.objects.count()}, "
+            f"комментариев {Comment.objects.count()}, "
+            f"подписок {Follow.objects.count()}"
+        )
+        targets = self.targets(options["user"])
+        if options["views"]:
+            unknown = set(options["views"]) - {name for name, *_ in targets}
+            if unknown:
+                raise CommandError(f"Нет таких страниц: {', '.join(unknown)}")
+            targets = [t for t in targets if t[0] in options["views"]]
+        self.stdout.write(
+            f"{'страница':<16}{'p50, мс':>9}{'p95, мс':>9}{'p99, мс':>9}"
+            f"{'запр/с':>9}{'SQL':>6}"
+        )
+        for name, url, data, client in targets:
+            self.measure(name, url, data, client, options)
+
+    def targets(self, username):
+        anonymous = Client()
+        reader = Client()
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f"Нет пользователя {username}.")
+        else:
+            user = (
+                User.objects.annotate(follows=Count("follower"))
+                .order_by("-follows", "pk")
+                .first()
+            )
+        reader.force_login(user)
+        group = (
+            Group.objects.annotate(total=Count("posts"))
+            .order_by("-total", "pk")
+            .first()
+        )
+        author = (
+            User.objects.annotate(total=Count("posts"))
+            .order_by("-total", "pk")
+            .first()
+        )
+        post = (
+            Post.objects.annotate(total=Count("comments"))
+            .order_by("-total", "-pk")
+            .first()
+        )
+        word = post.text.split()[0]
+        index = reverse("posts:index")
+        targets = [
+            ("index", index, None, anonymous),
+            ("index_page_50", index, {"page": 50}, anonymous),
+            ("index_logged_in", index, None, reader),
+            (
+                "profile",
+                reverse("posts:profile", args=[author.username]),
+                None,
+                anonymous,
+            ),
+            (
+                "post_detail",
+                reverse("posts:post_detail", args=[post.pk]),
+                None,
+                anonymous,
+            ),
+            ("follow_index", reverse("posts:follow_index"), None, reader),
+            ("search", reverse("posts:search"), {"q": word}, anonymous),
+            (
+                "autocomplete",
+                reverse("posts:autocomplete"),
+                {"q": author.username[:2]},
+                anonymous,
+            ),
+            ("about", reverse("about:author"), None, anonymous),
+        ]
+        if group is not None:
+            targets.insert(
+                3,
+                (
+                    "group_list",
+                    reverse("posts:group_list", args=[group.slug]),
+                    None,
+                    anonymous,
+                ),
+            )
+        return targets
+
+    def measure(self, name, url, data, client, options):
+        for _ in range(options["warmup"]):
+            client.get(url, data)
+        samples = []
+        queries = []
+        for _ in range(options["requests"]):
+            if options["cold"]:
+                cache.clear()
+            started = time.perf_counter()
+            response = client.get(url, data)
+            samples.append(time.perf_counter() - started)
+            found = QUERIES_RE.search(response.get("Server-Timing", ""))
+            if found:
+                queries.append(int(found.group(1)))
+        if response.status_code != 200:
+            self.stdout.write(
+                self.style.WARNING(f"{name}: ответ {response.status_code}")
+            )
+        sql = f"{statistics.mean(queries):6.1f}" if queries else f"{'-':>6}"
+        self.stdout.write(
+            f"{name:<16}"
+            f"{percentile(samples, 50) * 1000:9.1f}"
+            f"{percentile(samples, 95) * 1000:9.1f}"
+            f"{percentile(samples, 99) * 1000:9.1f}"
+            f"{len(samples) / sum(samples):9.0f}"
+            f"{sql}"
+        )
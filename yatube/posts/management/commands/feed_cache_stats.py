@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает счётчики кеша страниц лент. Воркеры сбрасывают их "
+        "раз в FEED_CACHE_STATS_FLUSH_INTERVAL секунд, поэтому последние "
+        "события могут быть ещё не видны."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Обнулить счётчики после вывода.",
+        )
+
+    def handle(self, *args, **options):
+        for event, value in get_cache_stats().items():
+            self.stdout.write(f"{event}: {value}")
+        if options["reset"]:
+            reset_cache_stats()
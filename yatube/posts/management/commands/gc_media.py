@@ -0,0 +1,186 @@
+import posixpath
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import MediaFile, Post, media_storage
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+POSTS_PREFIX = "posts"
+
+
+def walk(storage, path):
+    """Обходит каталог хранилища, не собирая список файлов в память."""
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def referenced(names):
+    """Какие из имён ещё записаны в Post.image."""
+    return set(
+        Post.objects.filter(image__in=names).values_list("image", flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет картинки и миниатюры sorl, на которые больше не "
+        "ссылается ни один пост. Хранилище обходится потоком, проверки "
+        "и удаление идут пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать сирот, ничего не удаляя.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько файлов проверять одним запросом.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Пауза в секундах после каждой пачки удалений.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60,
+            help=(
+                "Не трогать файлы моложе стольких секунд: пост с ними "
+                "может ещё сохраняться."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+        self.batch_size = options["batch_size"]
+        self.pause = options["pause"]
+        self.cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        sources = self.collect_sources()
+        originals = self.collect_originals()
+        thumbnails = self.collect_thumbnails()
+        verb = "Найдено" if self.dry_run else "Удалено"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb}: картинок {originals}, миниатюр {thumbnails}, "
+                f"записей sorl {sources}"
+            )
+        )
+
+    def progress(self, stage, checked, found):
+        self.stdout.write(f"{stage}: проверено {checked}, сирот {found}")
+
+    def throttle(self, deleted):
+        if deleted and not self.dry_run:
+            time.sleep(self.pause)
+
+    def is_old(self, storage, name):
+        try:
+            return storage.get_modified_time(name) < self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def collect_sources(self):
+        """Записи sorl о картинках без постов вместе с их миниатюрами."""
+        prefix = add_prefix("", "thumbnails")
+        keys = (
+            KVStore.objects.filter(key__startswith=prefix)
+            .order_by("key")
+            .values_list("key", flat=True)
+            .iterator()
+        )
+        checked = found = 0
+        for batch in batched(keys, self.batch_size):
+            records = KVStore.objects.filter(
+                key__in=[add_prefix(del_prefix(key)) for key in batch]
+            ).values_list("value", flat=True)
+            sources = [deserialize_image_file(value) for value in records]
+            alive = referenced([source.name for source in sources])
+            orphans = [s for s in sources if s.name not in alive]
+            if not self.dry_run:
+                for source in orphans:
+                    # Удаляет и файлы миниатюр, и их записи.
+                    default.kvstore.delete(source)
+            checked += len(batch)
+            found += len(orphans)
+            self.progress("Записи sorl", checked, found)
+            self.throttle(orphans)
+        return found
+
+    def collect_originals(self):
+        checked = found = 0
+        for batch in batched(
+            walk(media_storage, POSTS_PREFIX), self.batch_size
+        ):
+            alive = referenced(batch)
+            orphans = [
+                name
+                for name in batch
+                if name not in alive and self.is_old(media_storage, name)
+            ]
+            if not self.dry_run:
+                for name in orphans:
+                    media_storage.delete(name)
+                MediaFile.objects.filter(name__in=orphans).delete()
+            checked += len(batch)
+            found += len(orphans)
+            self.progress("Картинки", checked, found)
+            self.throttle(orphans)
+        return found
+
+    def collect_thumbnails(self):
+        """Файлы миниатюр, о которых sorl уже ничего не помнит."""
+        storage = default.storage
+        prefix = sorl_settings.THUMBNAIL_PREFIX.rstrip("/")
+        checked = found = 0
+        for batch in batched(walk(storage, prefix), self.batch_size):
+            keys = {
+                add_prefix(ImageFile(name, storage).key): name
+                for name in batch
+            }
+            known = set(
+                KVStore.objects.filter(key__in=keys).values_list(
+                    "key", flat=True
+                )
+            )
+            orphans = [
+                name
+                for key, name in keys.items()
+                if key not in known and self.is_old(storage, name)
+            ]
+            if not self.dry_run:
+                for name in orphans:
+                    storage.delete(name)
+            checked += len(batch)
+            found += len(orphans)
+            self.progress("Миниатюры", checked, found)
+            self.throttle(orphans)
+        return found
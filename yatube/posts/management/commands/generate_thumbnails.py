@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Готовит миниатюры постов, загруженных или изменённых на сайте. "
+        "С --watch работает как фоновый воркер очереди."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать миниатюры всех постов с картинками.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Не завершаться, а ждать новые посты в очереди.",
+        )
+
+    def handle(self, *args, **options):
+        done = self.process(pending_only=not options["all"])
+        while options["watch"]:
+            time.sleep(settings.THUMBNAIL_POLL_INTERVAL)
+            done += self.process(pending_only=True)
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово, обработано постов: {done}")
+        )
+
+    def process(self, pending_only):
+        posts = Post.objects.exclude(image="").order_by("pk")
+        if pending_only:
+            posts = posts.filter(thumbnails_ready=False)
+        done = 0
+        for post_id in posts.values_list("pk", flat=True).iterator():
+            done += generate_thumbnails(post_id)
+        return done
@@ -0,0 +1,53 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts.counters import count_for
+from posts.models import Profile, User
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики профилей и исправляет расхождения."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько пользователей пересчитывать за один проход.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by("pk").values_list("pk", flat=True)
+        user_ids = user_ids.iterator()
+        checked = fixed = 0
+        while True:
+            batch = list(islice(user_ids, options["batch_size"]))
+            if not batch:
+                break
+            fixed += self.repair(batch)
+            checked += len(batch)
+            self.stdout.write(f"Проверено профилей: {checked}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово, исправлено профилей: {fixed}")
+        )
+
+    def repair(self, user_ids):
+        counts = count_for(user_ids)
+        profiles = Profile.objects.in_bulk(user_ids)
+        fixed = 0
+        for user_id, fields in counts.items():
+            profile = profiles.get(user_id)
+            if profile is None:
+                Profile.objects.create(user_id=user_id, **fields)
+                fixed += 1
+                continue
+            changed = {
+                field: value
+                for field, value in fields.items()
+                if getattr(profile, field) != value
+            }
+            if changed:
+                Profile.objects.filter(user_id=user_id).update(**changed)
+                fixed += 1
+        return fixed
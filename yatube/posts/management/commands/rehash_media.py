@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.cache import bump_generation, post_scopes
+from posts.models import MediaFile, Post, media_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит картинки постов из плоского каталога posts/ "
+        "в раскладку по хешу содержимого и пересчитывает ссылки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет перенесено.",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image="")
+            .order_by()
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        moved = missing = 0
+        for name in names.iterator():
+            if media_storage.is_hashed(name):
+                continue
+            if not media_storage.exists(name):
+                missing += 1
+                self.stderr.write(f"Нет файла: {name}")
+                continue
+            if options["dry_run"]:
+                self.stdout.write(f"Будет перенесён: {name}")
+            else:
+                self.stdout.write(f"{name} -> {self.move(name)}")
+            moved += 1
+        if not options["dry_run"]:
+            self.recount()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово, перенесено файлов: {moved}, пропало: {missing}"
+            )
+        )
+
+    def move(self, name):
+        with media_storage.open(name) as content:
+            new_name = media_storage.save(name, content)
+        with transaction.atomic():
+            posts = Post.objects.select_related("author", "group").filter(
+                image=name
+            )
+            scopes = set()
+            for post in posts:
+                scopes.update(post_scopes(post))
+            # Миниатюры sorl привязаны к старому имени: их готовим заново.
+            posts.update(
+                image=new_name, thumbnails_ready=False, image_variants=""
+            )
+            transaction.on_commit(lambda: media_storage.delete(name))
+        bump_generation(*scopes)
+        return new_name
+
+    def recount(self):
+        references = (
+            Post.objects.exclude(image="")
+            .order_by()
+            .values_list("image")
+            .annotate(total=Count("pk"))
+        )
+        with transaction.atomic():
+            MediaFile.objects.all().delete()
+            MediaFile.objects.bulk_create(
+                MediaFile(name=name, refcount=total)
+                for name, total in references
+            )
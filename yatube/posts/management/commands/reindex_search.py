@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает поисковый индекс постов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько постов индексировать за один проход.",
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово, проиндексировано постов: {total} "
+                f"(индекс: {get_backend()})"
+            )
+        )
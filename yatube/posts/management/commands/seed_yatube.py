@@ -0,0 +1,253 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from faker import Faker
+from PIL import Image
+from posts.models import (Comment, Follow, Group, MediaFile, Post, User,
+                          media_storage)
+
+PASSWORD = "yatube-seed"
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Даёт задать даты полям с auto_now_add: лента растянута во времени."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет базу синтетическими пользователями, группами, постами, "
+        "комментариями, подписками и картинками. Записи вставляются "
+        "пачками через bulk_create, производные данные (счётчики, ленты, "
+        "поисковый индекс) пересчитываются командами проекта в конце."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--groups", type=int, default=10)
+        parser.add_argument("--posts", type=int, default=1000)
+        parser.add_argument("--comments", type=int, default=2000)
+        parser.add_argument("--follows", type=int, default=500)
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=20,
+            help="Сколько разных картинок сгенерировать для постов.",
+        )
+        parser.add_argument(
+            "--image-ratio",
+            type=float,
+            default=0.3,
+            help="Доля постов с картинкой.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="За сколько дней растянуть даты постов.",
+        )
+        parser.add_argument(
+            "--thumbnails",
+            action="store_true",
+            help="Сразу подготовить миниатюры постов с картинками.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.fake = Faker("ru_RU")
+        self.fake.seed_instance(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.span = timedelta(days=options["days"]).total_seconds()
+
+        users = self.create_users(options["users"])
+        if not users:
+            users = list(User.objects.values_list("pk", flat=True))
+        groups = self.create_groups(options["groups"])
+        images = self.create_images(options["images"])
+        posts = self.create_posts(
+            options["posts"], users, groups, images, options["image_ratio"]
+        )
+        self.create_comments(options["comments"], users, posts)
+        self.create_follows(options["follows"], users)
+
+        self.stdout.write("Пересчитываю производные данные...")
+        self.count_media_references(images)
+        commands = ["recount", "backfill_timelines", "reindex_search"]
+        if options["thumbnails"]:
+            commands.append("generate_thumbnails")
+        for command in commands:
+            verbose = options["verbosity"] > 1
+            stdout = self.stdout if verbose else StringIO()
+            call_command(command, stdout=stdout)
+        # Кеш страниц и счётчиков не знает о вставках в обход сигналов.
+        cache.clear()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: пользователей {len(users)}, групп {len(groups)}, "
+                f"постов {len(posts)}, комментариев {options['comments']}, "
+                f"подписок {options['follows']}, картинок {len(images)}."
+            )
+        )
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.random.random() * self.span)
+
+    def insert(self, model, objects, **kwargs):
+        """bulk_create пачками; возвращает id вставленных строк."""
+        start = model.objects.aggregate(last=Max("pk"))["last"] or 0
+        objects = iter(objects)
+        while True:
+            # Пачка собирается лениво, а bulk_create сам делит её под
+            # лимиты параметров базы.
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+        return list(
+            model.objects.filter(pk__gt=start)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def create_users(self, count):
+        start = User.objects.aggregate(last=Max("pk"))["last"] or 0
+        password = make_password(PASSWORD)
+        return self.insert(
+            User,
+            (
+                User(
+                    username=f"{self.fake.user_name()}_{start + number}",
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    email=self.fake.email(),
+                    password=password,
+                )
+                for number in range(1, count + 1)
+            ),
+        )
+
+    def create_groups(self, count):
+        start = Group.objects.aggregate(last=Max("pk"))["last"] or 0
+        return self.insert(
+            Group,
+            (
+                Group(
+                    title=self.fake.catch_phrase()[:200],
+                    slug=f"{self.fake.slug()}-{start + number}"[:200],
+                    description=self.fake.paragraph(),
+                )
+                for number in range(1, count + 1)
+            ),
+        )
+
+    def create_images(self, count):
+        names = []
+        for _ in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            image = Image.new("RGB", (960, 540), color)
+            buffer = BytesIO()
+            image.save(buffer, "JPEG", quality=80)
+            # Хранилище адресует файлы по содержимому: одинаковые цвета
+            # дадут один файл.
+            content = ContentFile(buffer.getvalue())
+            names.append(media_storage.save("posts/seed.jpg", content))
+        return sorted(set(names))
+
+    def create_posts(self, count, users, groups, images, image_ratio):
+        if not users:
+            return []
+        pub_date = Post._meta.get_field("pub_date")
+        with explicit_dates(pub_date):
+            return self.insert(
+                Post,
+                (
+                    self.make_post(users, groups, images, image_ratio)
+                    for _ in range(count)
+                ),
+            )
+
+    def make_post(self, users, groups, images, image_ratio):
+        image = ""
+        if images and self.random.random() < image_ratio:
+            image = self.random.choice(images)
+        group = None
+        if groups and self.random.random() < 0.7:
+            group = self.random.choice(groups)
+        return Post(
+            text=self.fake.paragraph(nb_sentences=5),
+            author_id=self.random.choice(users),
+            group_id=group,
+            image=image,
+            # Посты без картинки не ждут в очереди generate_thumbnails.
+            thumbnails_ready=not image,
+            pub_date=self.random_date(),
+        )
+
+    def create_comments(self, count, users, posts):
+        if not users or not posts:
+            return
+        created = Comment._meta.get_field("created")
+        with explicit_dates(created):
+            self.insert(
+                Comment,
+                (
+                    Comment(
+                        post_id=self.random.choice(posts),
+                        author_id=self.random.choice(users),
+                        text=self.fake.sentence(),
+                        created=self.random_date(),
+                    )
+                    for _ in range(count)
+                ),
+            )
+
+    def create_follows(self, count, users):
+        if len(users) < 2:
+            return
+        pairs = set()
+        # Не больше, чем бывает разных пар, иначе цикл не закончится.
+        count = min(count, len(users) * (len(users) - 1))
+        while len(pairs) < count:
+            user, author = self.random.sample(users, 2)
+            pairs.add((user, author))
+        # Уже существующие подписки пропускаются ограничением unique.
+        self.insert(
+            Follow,
+            (Follow(user_id=user, author_id=author) for user, author in pairs),
+            ignore_conflicts=True,
+        )
+
+    def count_media_references(self, images):
+        references = (
+            Post.objects.filter(image__in=images)
+            .order_by()
+            .values_list("image")
+            .annotate(total=Count("pk"))
+        )
+        for name, total in references:
+            MediaFile.objects.update_or_create(
+                name=name, defaults={"refcount": total}
+            )
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import MediaFile, media_storage
+
+
+def retain(name):
+    """Учитывает ещё одну ссылку на файл картинки."""
+    if not name:
+        return
+    updated = MediaFile.objects.filter(name=name).update(
+        refcount=F("refcount") + 1
+    )
+    if not updated:
+        _, created = MediaFile.objects.get_or_create(
+            name=name, defaults={"refcount": 1}
+        )
+        if not created:
+            MediaFile.objects.filter(name=name).update(
+                refcount=F("refcount") + 1
+            )
+
+
+def release(name):
+    """Снимает ссылку; файл без ссылок удаляется после коммита."""
+    if not name:
+        return
+    MediaFile.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F("refcount") - 1
+    )
+    if MediaFile.objects.filter(name=name, refcount=0).exists():
+        transaction.on_commit(lambda: _delete_if_orphan(name))
+
+
+def ensure_stored(name, content):
+    """Дозаписывает файл, удалённый до того, как на него взяли ссылку."""
+    if content is None or media_storage.exists(name):
+        return
+    content.seek(0)
+    media_storage.save(name, content)
+
+
+def _delete_if_orphan(name):
+    # Строка с нулевым счётчиком уходит в одной транзакции с файлом:
+    # параллельный retain либо успевает раньше, и файл остаётся,
+    # либо ждёт коммита и потом дозаписывает файл в ensure_stored.
+    with transaction.atomic():
+        deleted, _ = MediaFile.objects.filter(name=name, refcount=0).delete()
+        # Файлы старой раскладки и чужие пути хранилищу не принадлежат.
+        if deleted and media_storage.is_hashed(name):
+            media_storage.delete(name)
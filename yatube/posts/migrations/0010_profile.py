@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_profiles(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model("posts", "Post")
+    Follow = apps.get_model("posts", "Follow")
+    Profile = apps.get_model("posts", "Profile")
+    grouped = (
+        (Post, "author_id", "posts_count"),
+        (Follow, "author_id", "followers_count"),
+        (Follow, "user_id", "following_count"),
+    )
+    counts = {pk: {} for pk in User.objects.values_list("pk", flat=True)}
+    for model, column, field in grouped:
+        rows = (
+            model.objects.order_by()
+            .values_list(column)
+            .annotate(total=Count("pk"))
+        )
+        for user_id, total in rows:
+            counts[user_id][field] = total
+    Profile.objects.bulk_create(
+        (Profile(user_id=pk, **fields) for pk, fields in counts.items()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Профиль',
+                'verbose_name_plural': 'Профили',
+            },
+        ),
+        migrations.RunPython(fill_profiles, migrations.RunPython.noop),
+    ]
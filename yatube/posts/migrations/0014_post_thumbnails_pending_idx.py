@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(thumbnails_ready=False), fields=['id'], name='post_thumbnails_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:56
+
+from django.db import migrations, models
+
+import core.storage
+
+
+def count_references(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    MediaFile = apps.get_model("posts", "MediaFile")
+    references = (
+        Post.objects.exclude(image="")
+        .order_by()
+        .values_list("image")
+        .annotate(total=models.Count("pk"))
+    )
+    MediaFile.objects.bulk_create(
+        MediaFile(name=name, refcount=total) for name, total in references
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите картинку', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:06
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+FTS_TABLE = "posts_post_fts"
+
+
+def create_index(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    SearchTerm = apps.get_model("posts", "SearchTerm")
+    posts = Post.objects.order_by("pk").values_list("pk", "text")
+    if schema_editor.connection.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite собран без FTS5: остаётся обратный индекс.
+            pass
+        else:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+                    list(posts),
+                )
+            return
+    SearchTerm.objects.bulk_create(
+        SearchTerm(term=term[:64], post_id=pk, weight=weight)
+        for pk, text in posts.iterator()
+        for term, weight in Counter(
+            re.findall(r"\w+", text.casefold())
+        ).items()
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_mediafile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('weight', models.PositiveIntegerField(verbose_name='Вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+            options={
+                'verbose_name': 'Слово поиска',
+                'verbose_name_plural': 'Слова поиска',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['post'], name='search_term_post_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique search term'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def mark_existing_ready(apps, schema_editor):
+    # До очереди миниатюр картинки обрабатывались при показе страницы:
+    # уже загруженные посты не ждут воркера, attach_thumbnails сделает
+    # их миниатюры по требованию, а `generate_thumbnails --all` добавит
+    # srcset. Посты без картинки в очереди не нужны вовсе.
+    Post = apps.get_model("posts", "Post")
+    Post.objects.filter(thumbnails_ready=False).update(thumbnails_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
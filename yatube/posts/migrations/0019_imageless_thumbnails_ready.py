@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def mark_imageless_ready(apps, schema_editor):
+    # Посты без картинки, созданные до сигнала pre_save, висели в
+    # частичном индексе очереди миниатюр, хотя воркер их пропускает.
+    Post = apps.get_model("posts", "Post")
+    Post.objects.filter(image="", thumbnails_ready=False).update(
+        thumbnails_ready=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_existing_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_imageless_ready, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,17 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
+
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
 LEN_TEXT = 15
 
+media_storage = ContentAddressedStorage()
+
 
 class Group(models.Model):
     title = models.CharField(verbose_name="Название группы", max_length=200)
@@ -29,6 +36,9 @@ class Post(models.Model):
     pub_date = models.DateTimeField(
         verbose_name="Дата публикации", auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата изменения", auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -46,19 +56,60 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to="posts/",
+        storage=media_storage,
         blank=True,
         help_text="Загрузите картинку",
         verbose_name="Картинка",
     )
+    thumbnails_ready = models.BooleanField(
+        default=False, editable=False, verbose_name="Миниатюры готовы"
+    )
+    # JSON {"jpeg": [[имя файла, ширина], ...], ...} от фоновой обработки.
+    image_variants = models.TextField(
+        blank=True,
+        default="",
+        editable=False,
+        verbose_name="Варианты картинки",
+    )
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=["pub_date"], name="post_pub_date_idx"),
+            models.Index(
+                fields=["author", "pub_date"], name="post_author_date_idx"
+            ),
+            models.Index(
+                fields=["group", "pub_date"], name="post_group_date_idx"
+            ),
+            # Очередь `generate_thumbnails --watch`: только необработанные.
+            models.Index(
+                fields=["id"],
+                name="post_thumbnails_pending_idx",
+                condition=models.Q(thumbnails_ready=False),
+            ),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
 
     def __str__(self):
         return self.text[:LEN_TEXT]
 
+    @cached_property
+    def image_srcset(self):
+        """Значения srcset по форматам: {"jpeg": "url 320w, ...", ...}."""
+        if not self.image_variants:
+            return {}
+        storage = self.image.storage
+        return {
+            image_format: ", ".join(
+                f"{storage.url(name)} {width}w" for name, width in variants
+            )
+            for image_format, variants in json.loads(
+                self.image_variants
+            ).items()
+        }
+
 
 class Comment(models.Model):
 
@@ -77,6 +128,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(
+                fields=["post", "created"], name="comment_post_created_idx"
+            ),
+        ]
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
@@ -100,3 +156,105 @@ class Follow(models.Model):
         ]
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_date_post_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="timeline_user_author_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique timeline post"
+            )
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+
+
+class Profile(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="profile",
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name="Постов", default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Подписчиков", default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="Подписок", default=0
+    )
+
+    class Meta:
+        verbose_name = "Профиль"
+        verbose_name_plural = "Профили"
+
+    def __str__(self):
+        return str(self.user)
+
+
+class MediaFile(models.Model):
+    """Сколько постов ссылается на файл в хранилище картинок."""
+
+    name = models.CharField(
+        verbose_name="Файл", max_length=255, primary_key=True
+    )
+    refcount = models.PositiveIntegerField(verbose_name="Ссылок", default=0)
+
+    class Meta:
+        verbose_name = "Медиафайл"
+        verbose_name_plural = "Медиафайлы"
+
+    def __str__(self):
+        return self.name
+
+
+class SearchTerm(models.Model):
+    """Обратный индекс слов постов, если в базе нет FTS5."""
+
+    term = models.CharField(verbose_name="Слово", max_length=64)
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="search_terms"
+    )
+    weight = models.PositiveIntegerField(verbose_name="Вхождений")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["term", "post"], name="unique search term"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["post"], name="search_term_post_idx"),
+        ]
+        verbose_name = "Слово поиска"
+        verbose_name_plural = "Слова поиска"
+
+    def __str__(self):
+        return self.term
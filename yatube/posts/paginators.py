@@ -0,0 +1,314 @@
+import base64
+import binascii
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import F, Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import bump_generation, get_generation
+
+CURSOR_SEPARATOR = "|"
+COUNT_KEY = "posts:count:{}"
+COUNT_LOCK_TIMEOUT = 30
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(post):
+    """Превращает позицию поста в ленте в непрозрачный токен."""
+    raw = f"{post.pub_date.isoformat()}{CURSOR_SEPARATOR}{post.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Возвращает пару (pub_date, pk), закодированную в токене."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(token)
+    if pub_date is None:
+        raise InvalidCursor(token)
+    return pub_date, pk
+
+
+class CursorPage:
+    """Страница ленты без номера: знает только соседей."""
+
+    cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f"<Cursor page of {len(self.object_list)} posts>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(self.object_list[0])
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id) без OFFSET и COUNT(*).
+
+    `keys` — пути к полям, по которым идёт сортировка и фильтрация.
+    Значения в них должны совпадать с pub_date и pk поста: так лента
+    из TimelineEntry листается по индексу своей таблицы.
+    """
+
+    def __init__(self, queryset, per_page, keys=("pub_date", "pk")):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = keys
+
+    def _rows(self, cursor, lookup, descending):
+        date_key, pk_key = self.keys
+        # Аннотации переиспользуют join, уже добавленный фильтром ленты.
+        queryset = self.queryset.annotate(
+            cursor_date=F(date_key), cursor_id=F(pk_key)
+        )
+        if cursor is not None:
+            pub_date, pk = decode_cursor(cursor)
+            # Лишнее условие `date <= курсора` даёт индексу диапазон поиска.
+            queryset = queryset.filter(
+                Q(**{f"cursor_date__{lookup}e": pub_date})
+                & (
+                    Q(**{f"cursor_date__{lookup}": pub_date})
+                    | Q(**{f"cursor_id__{lookup}": pk})
+                )
+            )
+        prefix = "-" if descending else ""
+        ordering = (prefix + "cursor_date", prefix + "cursor_id")
+        return list(queryset.order_by(*ordering)[: self.per_page + 1])
+
+    def page(self, after=None, before=None):
+        """Страница после курсора `after` или перед курсором `before`."""
+        if before is not None:
+            rows = self._rows(before, "gt", descending=False)
+            has_previous = len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+            return CursorPage(rows, self, True, has_previous)
+        rows = self._rows(after, "lt", descending=True)
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[: self.per_page], self, has_next, after is not None
+        )
+
+    def get_page(self, after=None, before=None):
+        """Как `page()`, но испорченный токен ведёт на первую страницу."""
+        try:
+            page = self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
+        if not page.object_list and (after or before):
+            return self.page()
+        return page
+
+
+class ElidedPaginator(Paginator):
+    """Paginator со свёрнутым списком номеров страниц.
+
+    Вместо всех страниц отдаёт окно вокруг текущей и края ленты:
+    1 2 … 48 49 [50] 51 52 … 9998 9999. Повторяет
+    get_elided_page_range из Django 3.2.
+    """
+
+    ELLIPSIS = "…"
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+# Пересчёты, отложенные до конца ответа: receiver request_finished
+# выполняет их, когда страница уже отдана клиенту.
+_deferred = threading.local()
+
+
+def _count_key(scope):
+    return COUNT_KEY.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def _store_count(scope, generation, count):
+    cache.set(
+        _count_key(scope),
+        {
+            "generation": generation,
+            "count": count,
+            "fresh_until": time.time() + settings.POSTS_COUNT_TIMEOUT,
+        },
+        None,
+    )
+
+
+def refresh_count(scope, queryset, shown=None):
+    """Пересчитывает COUNT(*) ленты, если его не считает другой запрос.
+
+    `shown` — прикидка, с которой страница уже ушла клиенту. Если она
+    не совпала, поколение области увеличивается, чтобы кеш страниц не
+    держал неверные номера.
+    """
+    lock = f"{_count_key(scope)}:lock"
+    if not cache.add(lock, 1, COUNT_LOCK_TIMEOUT):
+        return
+    try:
+        # Поколение берётся до подсчёта: новый пост после него
+        # сделает запись устаревшей, а не потеряется.
+        generation = get_generation(scope)
+        count = queryset.count()
+        if shown is not None and count != shown:
+            bump_generation(scope)
+            generation = get_generation(scope)
+        _store_count(scope, generation, count)
+    finally:
+        cache.delete(lock)
+
+
+def run_deferred_counts():
+    pending = getattr(_deferred, "pending", None)
+    _deferred.pending = {}
+    for scope, (queryset, shown) in (pending or {}).items():
+        refresh_count(scope, queryset, shown)
+
+
+class LazyCountPaginator(ElidedPaginator):
+    """Нумерованные страницы без COUNT(*) на каждый запрос.
+
+    Страница выбирает per_page + 1 строк: лишняя говорит, есть ли
+    следующая. Общее число постов нужно только шаблону для номеров
+    страниц; оно берётся из кеша по области `scope`, а если там его нет
+    или поколение области сменилось — из того, что уже видно, и
+    пересчитывается после ответа. На последней странице число известно
+    точно и сразу попадает в кеш.
+    """
+
+    def __init__(self, object_list, per_page, scope, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+        self._seen = None
+        self._has_next = None
+
+    def validate_number(self, number):
+        # Верхнюю границу проверяет сама выборка страницы.
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            return super().validate_number(number)
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page + 1
+        rows = list(self.object_list[bottom:top])
+        if not rows and number > 1:
+            raise EmptyPage("Страница не содержит результатов")
+        self._has_next = len(rows) > self.per_page
+        self._seen = bottom + len(rows)
+        return self._get_page(rows[: self.per_page], number, self)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            pass
+        # Число постов из кеша могло оказаться больше настоящего: номер
+        # последней страницы считается заново по базе.
+        self.__dict__.pop("num_pages", None)
+        self.count = self._exact_count(get_generation(self.scope))
+        try:
+            return self.page(self.num_pages)
+        except EmptyPage:
+            # Лента успела сократиться ещё раз; первая страница есть всегда.
+            return self.page(1)
+
+    def _exact_count(self, generation):
+        if isinstance(self.object_list, QuerySet):
+            count = self.object_list.count()
+        else:
+            count = len(self.object_list)
+        _store_count(self.scope, generation, count)
+        return count
+
+    @cached_property
+    def count(self):
+        generation = get_generation(self.scope)
+        entry = cache.get(_count_key(self.scope))
+        fresh = (
+            entry is not None
+            and entry["generation"] == generation
+            and entry["fresh_until"] > time.time()
+        )
+        if self._seen is None:
+            # Страница за концом ленты: нужен точный номер последней.
+            if fresh:
+                return entry["count"]
+            return self._exact_count(generation)
+        if not self._has_next:
+            if not fresh or entry["count"] != self._seen:
+                _store_count(self.scope, generation, self._seen)
+            return self._seen
+        count = max(self._seen, entry["count"] if entry else 0)
+        if not fresh:
+            if not hasattr(_deferred, "pending"):
+                _deferred.pending = {}
+            _deferred.pending[self.scope] = (self.object_list, count)
+        return count
@@ -0,0 +1,250 @@
+import base64
+import binascii
+import re
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q, Sum
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = "posts_post_fts"
+TERM_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+CURSOR_SEPARATOR = "|"
+
+
+class InvalidSearchCursor(ValueError):
+    pass
+
+
+def terms(text):
+    """Слова текста в том виде, в каком они попадают в индекс."""
+    return [
+        term[:MAX_TERM_LENGTH] for term in TERM_RE.findall(text.casefold())
+    ]
+
+
+_fts5_found = False
+
+
+def fts5_available():
+    """Есть ли в базе таблица FTS5, созданная миграцией."""
+    global _fts5_found
+    if not _fts5_found and connection.vendor == "sqlite":
+        # Запоминаем только находку: таблица может появиться после migrate.
+        _fts5_found = FTS_TABLE in connection.introspection.table_names()
+    return _fts5_found
+
+
+def get_backend():
+    backend = settings.POSTS_SEARCH_BACKEND
+    if backend == "auto":
+        return "fts5" if fts5_available() else "inverted"
+    return backend
+
+
+def encode_search_cursor(rank, pk):
+    raw = f"{rank!r}{CURSOR_SEPARATOR}{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidSearchCursor(token)
+
+
+# Индексация
+
+
+def index_post(post):
+    """Заново индексирует текст поста."""
+    if get_backend() == "fts5":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, text) "
+                "VALUES (%s, %s)",
+                [post.pk, post.text],
+            )
+        return
+    SearchTerm.objects.filter(post_id=post.pk).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(term=term, post_id=post.pk, weight=weight)
+        for term, weight in Counter(terms(post.text)).items()
+    )
+
+
+def unindex_post(post_id):
+    if get_backend() == "fts5":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id]
+            )
+        return
+    SearchTerm.objects.filter(post_id=post_id).delete()
+
+
+def rebuild_index(batch_size=1000):
+    """Перестраивает индекс целиком; возвращает число постов."""
+    backend = get_backend()
+    if backend == "fts5":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    else:
+        SearchTerm.objects.all().delete()
+    rows = Post.objects.order_by("pk").values_list("pk", "text").iterator()
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return total
+        if backend == "fts5":
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+                    batch,
+                )
+        else:
+            SearchTerm.objects.bulk_create(
+                SearchTerm(term=term, post_id=pk, weight=weight)
+                for pk, text in batch
+                for term, weight in Counter(terms(text)).items()
+            )
+        total += len(batch)
+
+
+# Поиск
+
+
+def _fts_query(words):
+    # Каждое слово в кавычках — как литерал, со звёздочкой — как префикс.
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _search_fts(words, after, limit):
+    sql = (
+        f"SELECT rowid, rank FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [_fts_query(words)]
+    if after is not None:
+        rank, pk = after
+        sql += " AND (rank > %s OR (rank = %s AND rowid > %s))"
+        params += [rank, rank, pk]
+    sql += " ORDER BY rank, rowid LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_inverted(words, after, limit):
+    # Как и в FTS5, каждое слово запроса — префикс термина. Ранг — минус
+    # число вхождений: чем меньше, тем выше в выдаче, как у bm25.
+    words = set(words)
+    matches = {
+        f"matched_{i}": Count("term", filter=Q(term__startswith=word))
+        for i, word in enumerate(words)
+    }
+    prefixes = Q()
+    for word in words:
+        prefixes |= Q(term__startswith=word)
+    rows = (
+        SearchTerm.objects.filter(prefixes)
+        .values("post_id")
+        .annotate(rank=-Sum("weight"), **matches)
+        .filter(**{f"{name}__gt": 0 for name in matches})
+    )
+    if after is not None:
+        rank, pk = after
+        rows = rows.filter(Q(rank__gt=rank) | Q(rank=rank, post_id__gt=pk))
+    rows = rows.order_by("rank", "post_id").values_list("post_id", "rank")
+    return [(pk, float(rank)) for pk, rank in rows[:limit]]
+
+
+def search_ids(query, after=None, limit=None):
+    """Пары (id поста, ранг) по запросу, лучшие первыми.
+
+    `after` — пара (ранг, id), после которой продолжить выдачу.
+    """
+    words = terms(query)[:MAX_QUERY_TERMS]
+    if not words:
+        return []
+    if limit is None:
+        limit = settings.POSTS_SEARCH_PER_PAGE
+    if get_backend() == "fts5":
+        return _search_fts(words, after, limit)
+    return _search_inverted(words, after, limit)
+
+
+class SearchPage:
+    """Страница результатов поиска с курсором на следующую."""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        post = self.object_list[-1]
+        return encode_search_cursor(post.search_rank, post.pk)
+
+
+def search_page(query, cursor=None):
+    """Страница найденных постов после курсора `cursor`."""
+    after = None
+    if cursor:
+        try:
+            after = decode_search_cursor(cursor)
+        except InvalidSearchCursor:
+            cursor = None
+    per_page = settings.POSTS_SEARCH_PER_PAGE
+    found = search_ids(query, after, per_page + 1)
+    posts = Post.objects.select_related("author", "group").in_bulk(
+        [pk for pk, _ in found[:per_page]]
+    )
+    results = []
+    for pk, rank in found[:per_page]:
+        # Пост могли удалить между поиском и выборкой.
+        if pk in posts:
+            posts[pk].search_rank = rank
+            results.append(posts[pk])
+    return SearchPage(results, len(found) > per_page, bool(cursor))
+
+
+def filter_queryset(queryset, query, limit=None):
+    """Сужает queryset до постов, найденных по запросу (для админки).
+
+    Берутся только `limit` лучших по рангу совпадений, по умолчанию
+    POSTS_SEARCH_ADMIN_LIMIT; второй элемент ответа — обрезана ли выдача.
+    """
+    if limit is None:
+        limit = settings.POSTS_SEARCH_ADMIN_LIMIT
+    ids = [pk for pk, _ in search_ids(query, limit=limit + 1)]
+    return queryset.filter(pk__in=ids[:limit]), len(ids) > limit
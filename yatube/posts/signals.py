@@ -0,0 +1,181 @@
+from django.core.signals import request_finished
+from django.db.models import Q
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (autocomplete, counters, feeds, media, paginators, search,
+               timelines)
+from .cache import bump_generation, follower_scopes, post_scopes
+from .models import Comment, Follow, Group, Post, User
+
+# Поля, которые видны на страницах чужих постов: их правка сдвигает
+# updated_at этих постов, а с ним ETag и Last-Modified.
+GROUP_SHOWN_FIELDS = ("title", "slug")
+USER_SHOWN_FIELDS = ("username", "first_name", "last_name")
+
+
+def _touch(posts):
+    posts.update(updated_at=timezone.now())
+
+
+def _previous_values(sender, instance, fields, update_fields):
+    if instance.pk is None:
+        return None
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return None
+    return (
+        sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    )
+
+
+def _changed(instance, fields):
+    previous = getattr(instance, "previous_shown", None)
+    current = tuple(getattr(instance, field) for field in fields)
+    return previous is not None and previous != current
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # Пост могли перенести в другую группу: её страницы тоже устарели.
+    # Старая картинка нужна, чтобы снять с её файла ссылку.
+    instance.previous_group_slug = instance.previous_image = None
+    # Загруженный файл держим до post_save: хранилище могло не записать
+    # его как дубликат, а старую копию тем временем удалили.
+    instance.image_upload = (
+        None if instance.image._committed else instance.image.file
+    )
+    if not instance.image:
+        # Посту без картинки нечего ждать: в очередь миниатюр он не идёт.
+        instance.thumbnails_ready = True
+    if instance.pk is not None:
+        previous = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group__slug", "image")
+            .first()
+        )
+        if previous is not None:
+            instance.previous_group_slug, instance.previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        timelines.fan_out_post(instance)
+        feeds.invalidate_author_timeline(instance.author_id)
+        counters.bump(instance.author_id, "posts_count", 1)
+    previous_image = getattr(instance, "previous_image", None)
+    if created or previous_image != instance.image.name:
+        media.retain(instance.image.name)
+        media.ensure_stored(
+            instance.image.name, getattr(instance, "image_upload", None)
+        )
+        media.release(previous_image)
+    search.index_post(instance)
+    scopes = post_scopes(
+        instance, getattr(instance, "previous_group_slug", None)
+    )
+    if created:
+        scopes += follower_scopes(instance.author_id)
+    bump_generation(*scopes)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    feeds.invalidate_author_timeline(instance.author_id)
+    counters.bump(instance.author_id, "posts_count", -1)
+    media.release(instance.image.name)
+    search.unindex_post(instance.pk)
+    bump_generation(
+        *post_scopes(instance), *follower_scopes(instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        # Правка или удаление не самого нового комментария не меняет
+        # время последнего: ETag и Last-Modified поста сдвинет updated_at.
+        Post.objects.filter(pk=instance.post_id).update(
+            updated_at=timezone.now()
+        )
+    bump_generation(*post_scopes(instance.post))
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, update_fields=None, **kwargs):
+    instance.previous_shown = _previous_values(
+        sender, instance, GROUP_SHOWN_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    autocomplete.group_changed(instance)
+    if _changed(instance, GROUP_SHOWN_FIELDS):
+        _touch(Post.objects.filter(group=instance))
+    bump_generation("index", f"group:{instance.slug}")
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов уже не найти, в какой группе они были.
+    _touch(Post.objects.filter(group=instance))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    autocomplete.index.update("group", instance.pk)
+    bump_generation("index", f"group:{instance.slug}")
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    instance.previous_shown = _previous_values(
+        sender, instance, USER_SHOWN_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    autocomplete.user_changed(instance, update_fields)
+    if _changed(instance, USER_SHOWN_FIELDS):
+        # Имя автора видно на его постах, логин — ещё и под комментариями.
+        _touch(
+            Post.objects.filter(
+                Q(author=instance) | Q(comments__author=instance)
+            )
+        )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.index.update("user", instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        timelines.add_author(instance.user_id, instance.author_id)
+        counters.bump(instance.user_id, "following_count", 1)
+        counters.bump(instance.author_id, "followers_count", 1)
+        bump_generation(
+            f"profile:{instance.author.username}", f"follow:{instance.user_id}"
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timelines.remove_author(instance.user_id, instance.author_id)
+    counters.bump(instance.user_id, "following_count", -1)
+    counters.bump(instance.author_id, "followers_count", -1)
+    bump_generation(
+        f"profile:{instance.author.username}", f"follow:{instance.user_id}"
+    )
+
+
+@receiver(request_finished)
+def request_done(sender, **kwargs):
+    paginators.run_deferred_counts()
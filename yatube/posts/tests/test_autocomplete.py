@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import autocomplete
+from posts.cache import bump_generation, get_generation
+from posts.models import Group
+
+User = get_user_model()
+
+
+class AutocompleteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.leo = User.objects.create_user(username="leo")
+        cls.lena = User.objects.create_user(username="Lena")
+        cls.group = Group.objects.create(
+            title="Лесные птицы", slug="birds", description="Описание"
+        )
+
+    def setUp(self):
+        cache.clear()
+        autocomplete.index.clear()
+
+    def labels(self, prefix):
+        return [item["label"] for item in autocomplete.suggestions(prefix)]
+
+    def test_prefix_match(self):
+        """Подсказки ищутся по началу имени без учёта регистра."""
+        self.assertEqual(self.labels("LE"), ["Lena", "leo"])
+        self.assertEqual(self.labels("leo"), ["leo"])
+        self.assertEqual(self.labels("лесн"), ["Лесные птицы"])
+        self.assertEqual(self.labels("bi"), ["Лесные птицы"])
+        self.assertEqual(self.labels("x"), [])
+        self.assertEqual(self.labels(" "), [])
+
+    def test_limit(self):
+        self.assertEqual(len(autocomplete.suggestions("l", limit=1)), 1)
+
+    def test_no_queries_after_load(self):
+        """Загруженный индекс отвечает без запросов к базе."""
+        self.labels("le")
+        with self.assertNumQueries(0):
+            self.labels("len")
+
+    def test_signals_update_index(self):
+        self.labels("le")
+        user = User.objects.get(pk=self.leo.pk)
+        user.username = "max"
+        user.save()
+        Group.objects.get(pk=self.group.pk).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels("le"), ["Lena"])
+            self.assertEqual(self.labels("ma"), ["max"])
+            self.assertEqual(self.labels("bi"), [])
+
+    def test_login_keeps_generation(self):
+        """Вход пользователя не заставляет перечитывать индекс."""
+        self.labels("le")
+        generation = get_generation(autocomplete.SCOPE)
+        self.client.force_login(self.leo)
+        self.assertEqual(get_generation(autocomplete.SCOPE), generation)
+
+    def test_foreign_change_reloads(self):
+        """Изменение из другого процесса видно после смены поколения."""
+        self.labels("le")
+        User.objects.filter(pk=self.lena.pk).update(username="olga")
+        self.assertEqual(self.labels("ol"), [])
+        bump_generation(autocomplete.SCOPE)
+        self.assertEqual(self.labels("ol"), ["olga"])
+
+    def test_view(self):
+        response = self.client.get(reverse("posts:autocomplete"), {"q": "bi"})
+        self.assertEqual(
+            response.json(),
+            {
+                "results": [
+                    {
+                        "type": "group",
+                        "label": "Лесные птицы",
+                        "url": reverse("posts:group_list", args=["birds"]),
+                    }
+                ]
+            },
+        )
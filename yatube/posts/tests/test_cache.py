@@ -0,0 +1,207 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+
+from PIL import Image
+from posts import fragments
+from posts.cache import (FENCE_KEY, LOCK_KEY, STATS_KEY, bump_generation,
+                         cached_response, flush_cache_stats, get_cache_stats,
+                         get_generation, reset_cache_stats)
+from posts.models import Post
+from posts.thumbnails import attach_thumbnails, generate_thumbnails
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00"
+    b"\x01\x00\x00\x00\x00\x21\xf9\x04"
+    b"\x01\x0a\x00\x01\x00\x2c\x00\x00"
+    b"\x00\x00\x01\x00\x01\x00\x00\x02"
+    b"\x02\x4c\x01\x00\x3b"
+)
+
+
+class CachedResponseTest(TestCase):
+    key = "posts:page:test"
+
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return HttpResponse(f"версия {self.calls}")
+
+    def get(self):
+        return cached_response(self.key, get_generation("test"), self.compute)
+
+    def test_fresh_page_is_served_from_cache(self):
+        """Свежая страница не пересчитывается."""
+        self.get()
+        response = self.get()
+        self.assertEqual(response.content.decode(), "версия 1")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            get_cache_stats(), {"hit": 1, "stale": 0, "recompute": 1}
+        )
+
+    @override_settings(FEED_CACHE_STATS_FLUSH_INTERVAL=60)
+    def test_hits_are_counted_in_process(self):
+        """Попадание не пишет в общий кеш: счётчик сбрасывается позже."""
+        self.get()
+        flush_cache_stats()
+        with mock.patch.object(cache, "incr") as incr:
+            self.get()
+        incr.assert_not_called()
+        self.assertEqual(cache.get(STATS_KEY.format("hit")), None)
+        self.assertEqual(get_cache_stats()["hit"], 1)
+        flush_cache_stats()
+        self.assertEqual(cache.get(STATS_KEY.format("hit")), 1)
+        self.assertEqual(get_cache_stats()["hit"], 1)
+
+    def test_stale_page_served_while_locked(self):
+        """Пока другой воркер держит блокировку, отдаётся старая копия."""
+        self.get()
+        bump_generation("test")
+        cache.add(LOCK_KEY.format(self.key), "другой воркер", 30)
+        fence = cache.get(FENCE_KEY)
+        response = self.get()
+        self.assertEqual(response.content.decode(), "версия 1")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(get_cache_stats()["stale"], 1)
+        # Проигравший блокировку не выдаёт себе fencing-токен.
+        self.assertEqual(cache.get(FENCE_KEY), fence)
+
+    def test_single_recompute_after_invalidation(self):
+        """Устаревшую страницу пересчитывает взявший блокировку."""
+        self.get()
+        bump_generation("test")
+        response = self.get()
+        self.assertEqual(response.content.decode(), "версия 2")
+        self.assertIsNone(cache.get(LOCK_KEY.format(self.key)))
+        response = self.get()
+        self.assertEqual(response.content.decode(), "версия 2")
+        self.assertEqual(self.calls, 2)
+
+    def test_expired_lock_holder_does_not_overwrite(self):
+        """Запись с большим fencing-токеном не затирается старым воркером."""
+        self.get()
+        entry = cache.get(self.key)
+        entry["fence"] += 10 ** 6
+        cache.set(self.key, entry)
+        bump_generation("test")
+        self.get()
+        self.assertEqual(cache.get(self.key)["content"], "версия 1".encode())
+
+
+class ArticleFragmentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="author")
+        for i in range(3):
+            Post.objects.create(author=cls.user, text=f"Пост {i}")
+
+    def setUp(self):
+        cache.clear()
+
+    def posts(self):
+        return Post.objects.select_related("author")
+
+    def test_only_missing_fragments_are_rendered(self):
+        """Повторно рендерятся только фрагменты изменённых постов."""
+        fragments.attach_articles(self.posts())
+        post = Post.objects.first()
+        post.text = "Исправленный текст"
+        post.save()
+        with mock.patch.object(
+            fragments, "render_to_string", wraps=fragments.render_to_string
+        ) as render:
+            posts = fragments.attach_articles(self.posts())
+        self.assertEqual(render.call_count, 1)
+        self.assertIn("Исправленный текст", posts[0].article_html)
+        self.assertIn("Пост 1", posts[1].article_html)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username="author")
+        for i in range(3):
+            post = Post.objects.create(
+                author=author,
+                text=f"Пост {i}",
+                image=SimpleUploadedFile(
+                    f"small{i}.gif", SMALL_GIF, "image/gif"
+                ),
+            )
+            generate_thumbnails(post.pk)
+        Post.objects.create(author=author, text="Без картинки")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_thumbnails_are_fetched_in_one_query(self):
+        """Миниатюры всей страницы читаются одним запросом к базе."""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            attach_thumbnails(posts)
+        with self.assertNumQueries(0):
+            attach_thumbnails(posts)
+        ready = [post for post in posts if post.thumbnails]
+        self.assertEqual(len(ready), 3)
+        for post in ready:
+            self.assertTrue(post.thumbnails["article"].url.endswith(".jpg"))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        image = BytesIO()
+        Image.new("RGB", (2000, 800), "red").save(image, "PNG")
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username="author"),
+            text="Большая картинка",
+            image=SimpleUploadedFile("big.png", image.getvalue()),
+        )
+        generate_thumbnails(cls.post.pk)
+        cls.post.refresh_from_db()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_ladder_is_recorded_on_post(self):
+        """Все ширины лестницы сохраняются в модели."""
+        variants = json.loads(self.post.image_variants)
+        self.assertEqual(
+            [width for _, width in variants["jpeg"]],
+            list(settings.IMAGE_VARIANT_WIDTHS),
+        )
+
+    def test_templates_emit_srcset(self):
+        response = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(response, "<picture>")
+        self.assertContains(response, self.post.image_srcset["jpeg"])
+        self.assertContains(response, "1920w")
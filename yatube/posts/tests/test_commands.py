@@ -0,0 +1,327 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from PIL import Image
+from posts import media
+from posts.models import (Follow, MediaFile, Post, Profile, TimelineEntry,
+                          media_storage)
+from posts.search import search_ids
+from posts.thumbnails import generate_thumbnails
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00"
+    b"\x01\x00\x00\x00\x00\x21\xf9\x04"
+    b"\x01\x0a\x00\x01\x00\x2c\x00\x00"
+    b"\x00\x00\x01\x00\x01\x00\x00\x02"
+    b"\x02\x4c\x01\x00\x3b"
+)
+
+
+class BackfillTimelinesCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.follower = User.objects.create_user(username="follower")
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f"Пост {i}")
+            for i in range(3)
+        ]
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def test_backfill_rebuilds_timelines(self):
+        """Команда восстанавливает ленты по существующим подпискам."""
+        TimelineEntry.objects.all().delete()
+        call_command("backfill_timelines", stdout=StringIO())
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(user=self.follower).values_list(
+                    "post_id", flat=True
+                )
+            ),
+            {post.pk for post in self.posts},
+        )
+
+    def test_backfill_is_idempotent(self):
+        """Повторный запуск не дублирует записи ленты."""
+        call_command("backfill_timelines", stdout=StringIO())
+        call_command("backfill_timelines", "--clear", stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.count(), len(self.posts))
+
+
+class RecountCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.follower = User.objects.create_user(username="follower")
+        Post.objects.create(author=cls.author, text="Пост")
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def test_recount_repairs_drift(self):
+        """Команда исправляет разошедшиеся счётчики."""
+        Profile.objects.filter(user=self.author).update(
+            posts_count=10, followers_count=0
+        )
+        Profile.objects.filter(user=self.follower).delete()
+        call_command("recount", stdout=StringIO())
+        author = Profile.objects.get(user=self.author)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        follower = Profile.objects.get(user=self.follower)
+        self.assertEqual(follower.following_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateThumbnailsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text="Пост с картинкой",
+            image=SimpleUploadedFile("small.gif", SMALL_GIF, "image/gif"),
+        )
+        Post.objects.create(author=cls.author, text="Пост без картинки")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_pending_posts_get_thumbnails(self):
+        """Команда обрабатывает посты, которые ждут миниатюр."""
+        self.assertFalse(self.post.thumbnails_ready)
+        response = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(response, "Картинка обрабатывается")
+        out = StringIO()
+        call_command("generate_thumbnails", stdout=out)
+        self.assertIn("обработано постов: 1", out.getvalue())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnails_ready)
+        response = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertNotContains(response, "Картинка обрабатывается")
+        self.assertContains(response, "<img")
+
+    def test_posts_without_image_are_not_queued(self):
+        """Пост без картинки, в том числе после её удаления, не в очереди."""
+        self.assertFalse(
+            Post.objects.filter(image="", thumbnails_ready=False).exists()
+        )
+        self.post.image = ""
+        self.post.thumbnails_ready = False
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnails_ready)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name="small.gif"):
+        return Post.objects.create(
+            author=self.author,
+            text="Пост",
+            image=SimpleUploadedFile(name, SMALL_GIF, "image/gif"),
+        )
+
+    def refcount(self, post):
+        return MediaFile.objects.get(name=post.image.name).refcount
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки делят один файл и считают ссылки."""
+        first = self.create_post("first.gif")
+        second = self.create_post("second.gif")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r"^posts/\w\w/\w\w/\w{64}\.gif$")
+        self.assertEqual(self.refcount(first), 2)
+        second.delete()
+        self.assertEqual(self.refcount(first), 1)
+        self.assertTrue(media_storage.exists(first.image.name))
+
+    def test_upload_survives_concurrent_orphan_delete(self):
+        """Файл, удалённый перед retain дубликата, записывается заново."""
+        first = self.create_post()
+        name = first.image.name
+        first.delete()
+        retain = media.retain
+
+        def delete_then_retain(image_name):
+            # Отложенное удаление успевает между проверкой в хранилище
+            # и взятием ссылки.
+            media._delete_if_orphan(image_name)
+            retain(image_name)
+
+        with mock.patch("posts.media.retain", delete_then_retain):
+            second = self.create_post()
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(self.refcount(second), 1)
+
+    def test_retained_file_is_not_deleted(self):
+        """Ссылка, взятая до отложенного удаления, сохраняет файл."""
+        first = self.create_post()
+        name = first.image.name
+        first.delete()
+        second = self.create_post()
+        media._delete_if_orphan(name)
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(self.refcount(second), 1)
+
+    def test_rehash_moves_flat_files(self):
+        """Команда переносит старые файлы в раскладку по хешу."""
+        old_name = "posts/flat.gif"
+        FileSystemStorage().save(old_name, ContentFile(SMALL_GIF))
+        post = Post.objects.create(
+            author=self.author, text="Старый пост", image=old_name
+        )
+        call_command("rehash_media", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(media_storage.is_hashed(post.image.name))
+        self.assertFalse(post.thumbnails_ready)
+        self.assertEqual(self.refcount(post), 1)
+        self.assertFalse(MediaFile.objects.filter(name=old_name).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GarbageCollectMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        output = BytesIO()
+        Image.new("RGB", (4, 4), "blue").save(output, "PNG")
+        self.kept = Post.objects.create(
+            author=self.author,
+            text="Остаётся",
+            image=SimpleUploadedFile("kept.png", output.getvalue()),
+        )
+        self.removed = Post.objects.create(
+            author=self.author,
+            text="Удаляется",
+            image=SimpleUploadedFile("gone.gif", SMALL_GIF, "image/gif"),
+        )
+        generate_thumbnails(self.kept.pk)
+        generate_thumbnails(self.removed.pk)
+        self.kept.refresh_from_db()
+        self.removed.refresh_from_db()
+        self.thumbnails = {
+            name
+            for post in (self.kept, self.removed)
+            for name, _ in json.loads(post.image_variants)["jpeg"]
+        }
+        Post.objects.filter(pk=self.removed.pk).delete()
+
+    def test_dry_run_keeps_files(self):
+        out = StringIO()
+        call_command("gc_media", "--dry-run", "--min-age=0", stdout=out)
+        self.assertIn("Найдено: картинок 1", out.getvalue())
+        self.assertTrue(media_storage.exists(self.removed.image.name))
+
+    def test_orphans_are_deleted(self):
+        """Удаляются только файлы и миниатюры удалённого поста."""
+        call_command(
+            "gc_media", "--min-age=0", "--pause=0", stdout=StringIO()
+        )
+        self.assertFalse(media_storage.exists(self.removed.image.name))
+        self.assertTrue(media_storage.exists(self.kept.image.name))
+        variants = json.loads(self.kept.image_variants)["jpeg"]
+        kept = {name for name, _ in variants}
+        for name in self.thumbnails:
+            self.assertEqual(default_storage.exists(name), name in kept)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedAndBenchCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        call_command(
+            "seed_yatube",
+            "--users=6",
+            "--groups=2",
+            "--posts=40",
+            "--comments=20",
+            "--follows=10",
+            "--images=2",
+            "--batch-size=7",
+            "--seed=1",
+            stdout=StringIO(),
+        )
+
+    def test_seed_creates_consistent_data(self):
+        """Данные в обход сигналов дополнены счётчиками, лентами, индексом."""
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 10)
+        author = User.objects.filter(posts__isnull=False).first()
+        self.assertEqual(
+            Profile.objects.get(user=author).posts_count,
+            author.posts.count(),
+        )
+        follow = Follow.objects.first()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=follow.user_id, author=follow.author_id
+            ).exists()
+            or not Post.objects.filter(author=follow.author_id).exists()
+        )
+        self.assertEqual(
+            Post.objects.exclude(image="").filter(
+                thumbnails_ready=True
+            ).count(),
+            0,
+        )
+        for name, refcount in MediaFile.objects.values_list(
+            "name", "refcount"
+        ):
+            self.assertEqual(Post.objects.filter(image=name).count(), refcount)
+        post = Post.objects.first()
+        word = post.text.split()[0]
+        self.assertIn(
+            post.pk, [pk for pk, _ in search_ids(word, limit=100)]
+        )
+
+    def test_bench_views_reports_every_view(self):
+        out = StringIO()
+        call_command(
+            "bench_views", "--requests=2", "--warmup=0", stdout=out
+        )
+        for name in ("index", "post_detail", "follow_index", "search"):
+            self.assertIn(name, out.getvalue())
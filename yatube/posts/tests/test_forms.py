@@ -1,12 +1,16 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from PIL import Image
 from posts.forms import CommentForm, PostForm
+from posts.images import normalize_upload
 from posts.models import Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -64,13 +68,11 @@ class PostFormTests(TestCase):
             reverse("posts:profile", kwargs={"username": self.user.username}),
         )
         self.assertEqual(Post.objects.count(), post_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text="Тестовый текст",
-                author=self.user,
-                group=self.group,
-                image="posts/small.gif",
-            ).exists()
+        post = Post.objects.get(
+            text="Тестовый текст", author=self.user, group=self.group
+        )
+        self.assertRegex(
+            post.image.name, r"^posts/\w\w/\w\w/[0-9a-f]{64}\.gif$"
         )
 
     def test_edit_post(self):
@@ -164,3 +166,107 @@ class CommentPostCreateTest(TestCase):
         redirect = login + "?next=" + post
         self.assertRedirects(response, redirect)
         self.assertEqual(self.post.comments.count(), comment_count)
+
+
+@override_settings(IMAGE_MAX_SIDE=100)
+class ImageNormalizationTests(TestCase):
+    @staticmethod
+    def make_jpeg(size):
+        image = Image.new("RGB", size, "red")
+        exif = Image.Exif()
+        exif[0x010F] = "Камера"
+        output = BytesIO()
+        image.save(output, "JPEG", exif=exif.tobytes())
+        return SimpleUploadedFile("photo.jpeg", output.getvalue())
+
+    def test_upload_is_downscaled_without_exif(self):
+        """Большая картинка уменьшается, а EXIF не сохраняется."""
+        form = PostForm(
+            data={"text": "Фото"},
+            files={"image": self.make_jpeg((800, 400))},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data["image"])
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(image.format, "JPEG")
+        self.assertNotIn("exif", image.info)
+
+    def test_png_is_saved_without_exif(self):
+        """EXIF не переживает пересохранение и в PNG."""
+        exif = Image.Exif()
+        exif[0x010F] = "SecretCam"
+        exif[0x0110] = "GPSModel"
+        for size in ((800, 400), (80, 40)):
+            with self.subTest(size=size):
+                output = BytesIO()
+                Image.new("RGB", size, "red").save(
+                    output, "PNG", exif=exif.tobytes()
+                )
+                form = PostForm(
+                    data={"text": "Фото"},
+                    files={
+                        "image": SimpleUploadedFile(
+                            "photo.png", output.getvalue()
+                        )
+                    },
+                )
+                self.assertTrue(form.is_valid(), form.errors)
+                image = Image.open(form.cleaned_data["image"])
+                self.assertEqual(image.format, "PNG")
+                self.assertEqual(dict(image.getexif()), {})
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        form = PostForm(
+            data={"text": "Фото"},
+            files={"image": self.make_jpeg((100, 100))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("image", form.errors)
+
+    def test_palette_image_is_downscaled(self):
+        """Картинка с палитрой уменьшается без ошибки режима."""
+        image = Image.new("RGB", (6000, 100), "red").convert(
+            "P", palette=Image.ADAPTIVE
+        )
+        output = BytesIO()
+        image.save(output, "GIF")
+        form = PostForm(
+            data={"text": "Палитра"},
+            files={"image": SimpleUploadedFile("wide.gif", output.getvalue())},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data["image"])
+        self.assertEqual(image.format, "GIF")
+        self.assertEqual(image.width, 100)
+
+    def make_animation(self, size):
+        frames = [Image.new("RGB", size, color) for color in ("red", "blue")]
+        output = BytesIO()
+        frames[0].save(
+            output, "GIF", save_all=True, append_images=frames[1:],
+            duration=50, loop=0,
+        )
+        return SimpleUploadedFile("anim.gif", output.getvalue())
+
+    def test_animation_keeps_frames(self):
+        """Анимированный GIF не превращается в первый кадр."""
+        for size, expected in (((80, 40), (80, 40)), ((400, 200), (100, 50))):
+            with self.subTest(size=size):
+                form = PostForm(
+                    data={"text": "Анимация"},
+                    files={"image": self.make_animation(size)},
+                )
+                self.assertTrue(form.is_valid(), form.errors)
+                image = Image.open(form.cleaned_data["image"])
+                self.assertEqual(image.size, expected)
+                self.assertEqual(image.n_frames, 2)
+
+    def test_broken_image_rejected(self):
+        """Ошибка Pillow при декодировании — ошибка формы, а не 500."""
+        output = BytesIO()
+        Image.new("RGB", (400, 200), "red").save(output, "PNG")
+        # Заголовок цел, а данные пикселей обрезаны.
+        upload = SimpleUploadedFile("broken.png", output.getvalue()[:60])
+        with self.assertRaises(ValidationError):
+            normalize_upload(upload)
@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from posts.models import LEN_TEXT, Comment, Follow, Group, Post
+from posts.models import LEN_TEXT, Comment, Follow, Group, Post, Profile
 
 User = get_user_model()
 
@@ -96,3 +96,38 @@ class PostCommentModelTest(TestCase):
         follow = self.follow
         verbose_name = follow._meta.verbose_name
         self.assertEqual(verbose_name, "Подписка")
+
+
+class ProfileCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.follower = User.objects.create_user(username="follower")
+
+    def assertCounters(self, user, **expected):
+        profile = Profile.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(profile, field), value)
+
+    def test_post_counter_follows_saves_and_deletes(self):
+        """Счётчик постов меняется при создании и удалении поста."""
+        posts = [
+            Post.objects.create(author=self.author, text=f"Пост {i}")
+            for i in range(3)
+        ]
+        self.assertCounters(self.author, posts_count=3)
+        posts[0].delete()
+        self.assertCounters(self.author, posts_count=2)
+        Post.objects.filter(author=self.author).delete()
+        self.assertCounters(self.author, posts_count=0)
+
+    def test_follow_counters(self):
+        """Счётчики подписок меняются при подписке и отписке."""
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        self.assertCounters(self.author, followers_count=1)
+        self.assertCounters(self.follower, following_count=1)
+        follow.delete()
+        self.assertCounters(self.author, followers_count=0)
+        self.assertCounters(self.follower, following_count=0)
@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from users import urls as users_urls
+
+from .utils import QueryBudgetMixin, seed_data
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Бюджет запросов: (аноним, вошедший пользователь).
+BUDGETS = {
+    "posts:index": (2, 4),
+    "posts:group_list": (3, 5),
+    "posts:profile": (3, 6),
+    "posts:search": (2, 4),
+    "posts:autocomplete": (2, 2),
+    "posts:post_detail": (3, 5),
+    "posts:post_create": (0, 3),
+    "posts:post_edit": (0, 4),
+    "posts:add_comment": (0, 2),
+    "posts:follow_index": (0, 3),
+    "posts:profile_follow": (0, 3),
+    "posts:profile_unfollow": (0, 4),
+    "users:signup": (0, 2),
+    "users:logout": (0, 4),
+    "users:login": (0, 2),
+    "users:password_reset_form": (0, 2),
+    "users:password_reset_done": (0, 2),
+    "users:password_reset_confirm": (1, 5),
+    "users:password_reset_complete": (0, 2),
+    "users:password_change_form": (0, 2),
+    "users:password_change_done": (0, 2),
+    "about:author": (0, 2),
+    "about:tech": (0, 2),
+}
+
+
+def url_names():
+    return [
+        f"{module.app_name}:{pattern.name}"
+        for module in (posts_urls, users_urls, about_urls)
+        for pattern in module.urlpatterns
+    ]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def url_args(self, name):
+        author = self.data["author"]
+        args = {
+            "posts:group_list": [self.data["group"].slug],
+            "posts:profile": [author.username],
+            "posts:post_detail": [self.data["post"].pk],
+            "posts:post_edit": [self.data["post"].pk],
+            "posts:add_comment": [self.data["post"].pk],
+            "posts:profile_follow": [author.username],
+            "posts:profile_unfollow": [author.username],
+            "users:password_reset_confirm": [
+                urlsafe_base64_encode(force_bytes(author.pk)),
+                default_token_generator.make_token(author),
+            ],
+        }
+        return args.get(name, [])
+
+    def test_every_url_has_budget(self):
+        """Новый URL без бюджета запросов не пройдёт незамеченным."""
+        self.assertCountEqual(BUDGETS, url_names())
+
+    def test_query_budgets(self):
+        data = {
+            "posts:search": {"q": "пост"},
+            "posts:autocomplete": {"q": "au"},
+        }
+        for name, budgets in BUDGETS.items():
+            url = reverse(name, args=self.url_args(name))
+            for user, budget in zip((None, self.data["author"]), budgets):
+                with self.subTest(url=url, user=user):
+                    self.assertQueryBudget(url, budget, user, data.get(name))
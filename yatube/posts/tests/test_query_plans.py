@@ -0,0 +1,76 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+from .utils import QueryPlanMixin
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN из SQLite")
+class FeedQueryPlanTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание",
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f"Пост {i}"
+            )
+            for i in range(15)
+        ]
+        for post in cls.posts[:3]:
+            Comment.objects.create(post=post, author=cls.reader, text="Ок")
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed_urls(self):
+        return [
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": "author"}),
+            reverse("posts:follow_index"),
+        ]
+
+    def test_numbered_feeds_use_indexes(self):
+        """Ленты с номерами страниц не сортируют и не сканируют таблицы."""
+        for url in self.feed_urls():
+            for page in (1, 2):
+                with self.subTest(url=url, page=page):
+                    self.assertIndexedQueries(self.client, url, {"page": page})
+
+    @override_settings(POSTS_PAGINATION="cursor")
+    def test_cursor_feeds_use_indexes(self):
+        """Курсорные ленты листаются по индексам в обе стороны."""
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                response = self.assertIndexedQueries(self.client, url)
+                page = response.context["page_obj"]
+                response = self.assertIndexedQueries(
+                    self.client, url, {"after": page.next_cursor}
+                )
+                page = response.context["page_obj"]
+                self.assertIndexedQueries(
+                    self.client, url, {"before": page.previous_cursor}
+                )
+
+    def test_post_detail_uses_indexes(self):
+        """Страница поста читает комментарии по индексу."""
+        self.assertIndexedQueries(
+            self.client,
+            reverse("posts:post_detail", kwargs={"post_id": self.posts[0].pk}),
+        )
@@ -0,0 +1,140 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, SearchTerm
+
+User = get_user_model()
+
+
+class SearchIndexMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="auth")
+        cls.apple = Post.objects.create(
+            author=cls.user, text="Яблоко, яблоко и ещё раз Яблоко"
+        )
+        cls.both = Post.objects.create(
+            author=cls.user, text="Яблоко и груша в одном саду"
+        )
+        cls.pear = Post.objects.create(author=cls.user, text="Только груша")
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, **kwargs):
+        return [pk for pk, _ in search.search_ids(query, **kwargs)]
+
+    def test_results_are_ranked(self):
+        """Пост, где слово встречается чаще, идёт первым."""
+        self.assertEqual(
+            self.found("яблоко"), [self.apple.pk, self.both.pk]
+        )
+
+    def test_all_words_must_match(self):
+        """Находятся только посты со всеми словами запроса."""
+        self.assertEqual(self.found("ГРУША яблоко"), [self.both.pk])
+
+    def test_empty_query_finds_nothing(self):
+        self.assertEqual(self.found("  ,. "), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при правке и удалении поста."""
+        pear = Post.objects.get(pk=self.pear.pk)
+        pear.text = "Теперь слива"
+        pear.save()
+        self.assertEqual(self.found("слива"), [pear.pk])
+        self.assertEqual(self.found("груша"), [self.both.pk])
+        Post.objects.get(pk=self.both.pk).delete()
+        self.assertEqual(self.found("груша"), [])
+
+    def test_cursor_pages(self):
+        """Курсор продолжает выдачу без повторов и пропусков."""
+        with self.settings(POSTS_SEARCH_PER_PAGE=1):
+            first = search.search_page("яблоко")
+            self.assertEqual(list(first), [self.apple])
+            self.assertTrue(first.has_next())
+            second = search.search_page("яблоко", first.next_cursor)
+            self.assertEqual(list(second), [self.both])
+            self.assertFalse(second.has_next())
+            self.assertTrue(second.has_previous())
+
+    def test_prefix_match(self):
+        """Начало слова находит пост целиком."""
+        self.assertCountEqual(
+            self.found("груш"), [self.both.pk, self.pear.pk]
+        )
+        self.assertEqual(self.found("ябл гру"), [self.both.pk])
+
+    def test_rebuild_index(self):
+        self.assertEqual(search.rebuild_index(batch_size=2), 3)
+        self.assertCountEqual(
+            self.found("груша"), [self.both.pk, self.pear.pk]
+        )
+
+
+@override_settings(POSTS_SEARCH_BACKEND="fts5")
+class FullTextSearchTest(SearchIndexMixin, TestCase):
+    def test_fts_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе считаются обычными словами."""
+        self.assertEqual(self.found('груша OR "яблоко'), [])
+
+
+@override_settings(POSTS_SEARCH_BACKEND="inverted")
+class InvertedIndexSearchTest(SearchIndexMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Посты созданы до переключения бэкенда: индексируем заново.
+        with override_settings(POSTS_SEARCH_BACKEND="inverted"):
+            search.rebuild_index()
+
+    def test_terms_are_counted(self):
+        self.assertEqual(
+            SearchTerm.objects.get(post=self.apple, term="яблоко").weight, 3
+        )
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        cls.post = Post.objects.create(author=cls.user, text="Редкое слово")
+        Post.objects.create(author=cls.user, text="Обычный текст")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_page(self):
+        response = self.client.get(reverse("posts:search"), {"q": "редкое"})
+        self.assertTemplateUsed(response, "posts/search.html")
+        self.assertEqual(list(response.context["page_obj"]), [self.post])
+
+    def test_bad_cursor_starts_over(self):
+        response = self.client.get(
+            reverse("posts:search"), {"q": "редкое", "after": "мусор"}
+        )
+        self.assertEqual(list(response.context["page_obj"]), [self.post])
+
+    def test_admin_uses_index(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "редкое"}
+        )
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.post]
+        )
+
+    @override_settings(POSTS_SEARCH_ADMIN_LIMIT=1)
+    def test_admin_warns_about_truncated_results(self):
+        Post.objects.create(author=self.user, text="Ещё одно редкое слово")
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "редкое"}
+        )
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+        self.assertEqual(len(list(response.context["messages"])), 1)
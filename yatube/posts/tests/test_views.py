@@ -6,10 +6,15 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Comment, Group, Post, User
+from posts.cache import get_generation
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.paginators import (ElidedPaginator, LazyCountPaginator,
+                              run_deferred_counts)
 
 User = get_user_model()
 
@@ -150,6 +155,7 @@ class PostPagesTests(TestCase):
         self.assertFalse(response.context["page_obj"])
         for reverse_page, object in context_fields.items():
             with self.subTest(reverse_page=reverse_page):
+                cache.clear()
                 response = self.author.get(reverse_page)
                 group_object = response.context["group"]
                 self.assertEqual(group_object.title, object.title)
@@ -286,6 +292,183 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(page_object.group, expected_object.group)
             self.assertEqual(page_object.pub_date, expected_object.pub_date)
 
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_elided_page_range(self):
+        """Номера страниц сворачиваются вокруг текущей."""
+        # Первый ответ знает только нижнюю границу числа постов и
+        # пересчитывает его после отдачи; второй видит точное число.
+        self.client.get(reverse("posts:index") + "?page=7")
+        response = self.client.get(reverse("posts:index") + "?page=7")
+        self.assertEqual(
+            response.context["page_range"],
+            [1, "…", 5, 6, 7, 8, 9, "…", 13],
+        )
+        self.assertContains(response, "?page=13")
+        self.assertNotContains(response, "?page=3")
+
+
+class ElidedPaginatorTest(TestCase):
+    def elided(self, number, num_pages):
+        paginator = ElidedPaginator(range(num_pages), 1)
+        return list(
+            paginator.get_elided_page_range(number, on_each_side=2, on_ends=1)
+        )
+
+    def test_short_range_is_not_elided(self):
+        self.assertEqual(self.elided(3, 6), [1, 2, 3, 4, 5, 6])
+
+    def test_edges(self):
+        self.assertEqual(self.elided(1, 100), [1, 2, 3, "…", 100])
+        self.assertEqual(self.elided(5, 100), [1, 2, 3, 4, 5, 6, 7, "…", 100])
+        self.assertEqual(self.elided(100, 100), [1, "…", 98, 99, 100])
+
+    def test_middle(self):
+        self.assertEqual(
+            self.elided(50, 9999), [1, "…", 48, 49, 50, 51, 52, "…", 9999]
+        )
+
+
+class LazyCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="lazy_author")
+        Post.objects.bulk_create(
+            Post(text=f"Пост {i}", author=cls.user) for i in range(13)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.queryset = Post.objects.order_by("-pk")
+
+    def paginator(self):
+        return LazyCountPaginator(self.queryset, 5, "test")
+
+    def test_page_without_count(self):
+        """Страница и признак следующей получаются без COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            page = self.paginator().page(1)
+            self.assertTrue(page.has_next())
+            self.assertEqual(len(page), 5)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT(", queries[0]["sql"])
+
+    def test_estimate_is_refreshed_after_response(self):
+        """Прикидка числа постов пересчитывается после ответа."""
+        paginator = self.paginator()
+        paginator.page(1)
+        self.assertEqual(paginator.count, 6)
+        generation = get_generation("test")
+        run_deferred_counts()
+        self.assertNotEqual(get_generation("test"), generation)
+        paginator = self.paginator()
+        paginator.page(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 13)
+
+    def test_last_page_stores_exact_count(self):
+        paginator = self.paginator()
+        page = paginator.page(3)
+        self.assertFalse(page.has_next())
+        self.assertEqual(paginator.num_pages, 3)
+        paginator = self.paginator()
+        paginator.page(1)
+        self.assertEqual(paginator.count, 13)
+
+    def test_page_past_the_end(self):
+        """Номер за концом ленты ведёт на последнюю страницу."""
+        page = self.paginator().get_page(100)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 3)
+
+    def test_stale_count_past_the_end(self):
+        """Завышенное число в кеше не ломает страницу за концом ленты."""
+        paginator = self.paginator()
+        paginator.page(3)
+        self.assertEqual(paginator.count, 13)
+        Post.objects.filter(
+            pk__in=self.queryset.values_list("pk", flat=True)[:10]
+        ).delete()
+        page = self.paginator().get_page(3)
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 3)
+
+    def test_unfollow_updates_follow_feed(self):
+        """Старый номер страницы ленты подписок после отписки не даёт 500."""
+        reader = User.objects.create(username="lazy_reader")
+        client = Client()
+        client.force_login(reader)
+        Follow.objects.create(user=reader, author=self.user)
+        url = reverse("posts:follow_index")
+        client.get(url)
+        client.get(url, {"page": 2})
+        Follow.objects.filter(user=reader, author=self.user).delete()
+        response = client.get(url, {"page": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page_obj"].number, 1)
+        self.assertFalse(response.context["page_obj"])
+
+
+@override_settings(POSTS_PAGINATION="cursor")
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="posts_author",)
+        cls.group = Group.objects.create(
+            title="Тестовое название группы",
+            slug="test-slug",
+            description="Тестовое описание группы",
+        )
+        cls.post = [
+            Post.objects.create(
+                text=f"Пост {i}",
+                author=CursorPaginatorViewsTest.user,
+                group=CursorPaginatorViewsTest.group,
+            )
+            for i in range(13)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(CursorPaginatorViewsTest.user)
+
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и предыдущую страницы."""
+        urls = [
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first_page = self.client.get(url).context["page_obj"]
+                self.assertEqual(len(first_page), 10)
+                self.assertTrue(first_page.has_next())
+                self.assertFalse(first_page.has_previous())
+                second_page = self.client.get(
+                    url, {"after": first_page.next_cursor}
+                ).context["page_obj"]
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(second_page[0].text, self.post[2].text)
+                back_page = self.client.get(
+                    url, {"before": second_page.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(
+                    [post.pk for post in back_page],
+                    [post.pk for post in first_page],
+                )
+                self.assertFalse(back_page.has_previous())
+
+    def test_invalid_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse("posts:index"), {"after": "not-a-cursor"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
 
 class CacheIndexPageTest(TestCase):
     @classmethod
@@ -300,20 +483,189 @@ class CacheIndexPageTest(TestCase):
     def test_cache(self):
         """Тестирование кеша главной страницы."""
         new_post = Post.objects.create(text="Тестовый пост", author=self.user,)
-        response_content_1 = self.authorized_client.get(
-            reverse("posts:index")
-        ).content
+        response_1 = self.authorized_client.get(reverse("posts:index"))
+        response_2 = self.authorized_client.get(reverse("posts:index"))
+        self.assertTemplateNotUsed(response_2, "posts/index.html")
+        self.assertEqual(response_1.content, response_2.content)
         new_post.delete()
-        response_content_2 = self.authorized_client.get(
-            reverse("posts:index")
-        ).content
-        self.assertEqual(response_content_1, response_content_2)
+        response_3 = self.authorized_client.get(reverse("posts:index"))
+        self.assertTemplateUsed(response_3, "posts/index.html")
+        self.assertNotEqual(response_2.content, response_3.content)
+
+    def test_scoped_generations(self):
+        """Изменения поста сбрасывают только страницы его областей."""
+        group = Group.objects.create(
+            title="Группа", slug="cache-group", description="Описание",
+        )
+        other_group = Group.objects.create(
+            title="Другая группа", slug="other-group", description="Описание",
+        )
+        post = Post.objects.create(
+            text="Пост группы", author=self.user, group=group,
+        )
+        urls = {
+            "group": reverse("posts:group_list", kwargs={"slug": group.slug}),
+            "other": reverse(
+                "posts:group_list", kwargs={"slug": other_group.slug}
+            ),
+            "profile": reverse(
+                "posts:profile", kwargs={"username": self.user.username}
+            ),
+        }
+        for url in urls.values():
+            self.authorized_client.get(url)
+        post.group = other_group
+        post.save()
+        for name, url in urls.items():
+            with self.subTest(name=name):
+                response = self.authorized_client.get(url)
+                self.assertIsNotNone(response.context.get("page_obj"))
+        unrelated = Group.objects.create(
+            title="Чужая группа", slug="unrelated", description="Описание",
+        )
+        unrelated_url = reverse(
+            "posts:group_list", kwargs={"slug": unrelated.slug}
+        )
+        self.authorized_client.get(unrelated_url)
+        Post.objects.create(text="Ещё пост", author=self.user, group=group)
+        response = self.authorized_client.get(unrelated_url)
+        self.assertTemplateNotUsed(response, "posts/group_list.html")
+
+    def test_shared_body_with_personal_header(self):
+        """Вошедшие делят тело страницы, но видят свою шапку."""
+        other_user = User.objects.create(username="other_reader")
+        other_client = Client()
+        other_client.force_login(other_user)
+        self.authorized_client.get(reverse("posts:index"))
+        response = other_client.get(reverse("posts:index"))
+        self.assertTemplateNotUsed(response, "posts/index.html")
+        self.assertContains(response, "Пользователь: other_reader")
+        self.assertNotContains(response, self.user.username)
+        response = Client().get(reverse("posts:index"))
+        self.assertTemplateUsed(response, "posts/index.html")
+        self.assertContains(response, "Войти")
+
+    def test_not_found_page_has_header(self):
+        """Страница 404 кешируемой ленты рисует шапку, а не метку."""
+        for url in (
+            reverse("posts:group_list", kwargs={"slug": "nope"}),
+            reverse("posts:profile", kwargs={"username": "nobody"}),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertNotContains(
+                    response, "<!--hole:", status_code=404
+                )
+                self.assertContains(
+                    response, f"Пользователь: {self.user.username}",
+                    status_code=404,
+                )
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="posts_author")
+        cls.group = Group.objects.create(
+            title="Группа", slug="conditional", description="Описание",
+        )
+        cls.post = Post.objects.create(
+            text="Тестовый пост", author=cls.user, group=cls.group,
+        )
+
+    def setUp(self):
         cache.clear()
-        response_content_3 = self.authorized_client.get(
-            reverse("posts:index")
-        ).content
-        self.assertNotEqual(response_content_2, response_content_3)
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменённые страницы отдают 304 без основных запросов."""
+        urls = {
+            reverse("posts:post_detail", kwargs={"post_id": self.post.pk}): 1,
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}): 0,
+            reverse("posts:profile", kwargs={"username": "posts_author"}): 0,
+        }
+        for url, queries in urls.items():
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)["ETag"]
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Правка поста и новый комментарий меняют ETag страницы поста."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.pk})
+        group_url = reverse(
+            "posts:group_list", kwargs={"slug": self.group.slug}
+        )
+        etag = self.author_client.get(url)["ETag"]
+        group_etag = self.author_client.get(group_url)["ETag"]
+        self.author_client.post(
+            reverse("posts:post_edit", kwargs={"post_id": self.post.pk}),
+            {"text": "Исправленный текст", "group": self.group.pk},
+        )
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.author_client.get(
+            group_url, HTTP_IF_NONE_MATCH=group_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        etag = self.author_client.get(url)["ETag"]
+        self.author_client.post(
+            reverse("posts:add_comment", kwargs={"post_id": self.post.pk}),
+            {"text": "Комментарий"},
+        )
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_comment_invalidates_validators(self):
+        """Удаление не последнего комментария тоже меняет ETag."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.pk})
+        older = Comment.objects.create(
+            post=self.post, author=self.user, text="Первый"
+        )
+        Comment.objects.create(post=self.post, author=self.user, text="Второй")
+        etag = self.guest_client.get(url)["ETag"]
+        older.delete()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+    def test_related_changes_invalidate_validators(self):
+        """Переименование группы, автора и комментатора меняет ETag."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.pk})
+        commenter = User.objects.create(username="commenter")
+        Comment.objects.create(
+            post=self.post, author=commenter, text="Комментарий"
+        )
+        changes = (
+            (Group, self.group.pk, "title"),
+            (User, self.user.pk, "last_name"),
+            (User, commenter.pk, "username"),
+        )
+        for model, pk, field in changes:
+            with self.subTest(field=field):
+                etag = self.guest_client.get(url)["ETag"]
+                instance = model.objects.get(pk=pk)
+                setattr(instance, field, f"Новый_{field}")
+                instance.save()
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertContains(response, f"Новый_{field}")
 
+    def test_login_keeps_validators(self):
+        """Вход автора не трогает страницы его постов."""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.pk})
+        etag = self.guest_client.get(url)["ETag"]
+        self.author_client.force_login(self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -374,3 +726,60 @@ class FollowViewsTest(TestCase):
         )
         response = self.author_client.get(reverse("posts:follow_index"))
         self.assertEqual((len(page_object)), 0)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(
+            author=self.author, text="Свежий пост",
+        )
+        response = self.follower_client.get(reverse("posts:follow_index"))
+        self.assertEqual(response.context["page_obj"][0], new_post)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=new_post
+            ).exists()
+        )
+        new_post.delete()
+        response = self.follower_client.get(reverse("posts:follow_index"))
+        self.assertEqual(list(response.context["page_obj"]), [self.post])
+
+    def test_follow_feed_engines_agree(self):
+        """Все движки ленты подписок отдают одинаковые посты."""
+        other_author = User.objects.create(username="other_author")
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=other_author)
+        for i in range(12):
+            Post.objects.create(
+                author=(self.author, other_author)[i % 2], text=f"Пост {i}"
+            )
+        feeds = {}
+        for engine in ("join", "timeline", "merge"):
+            feeds[engine] = []
+            for page in (1, 2):
+                with self.settings(FOLLOW_FEED_ENGINE=engine):
+                    response = self.follower_client.get(
+                        reverse("posts:follow_index"), {"page": page}
+                    )
+                feeds[engine].append(
+                    [post.pk for post in response.context["page_obj"]]
+                )
+        self.assertEqual(len(feeds["join"][0]), 10)
+        self.assertEqual(len(feeds["join"][1]), 3)
+        self.assertEqual(feeds["timeline"], feeds["join"])
+        self.assertEqual(feeds["merge"], feeds["join"])
+        for engine in ("join", "timeline"):
+            with self.settings(
+                FOLLOW_FEED_ENGINE=engine, POSTS_PAGINATION="cursor"
+            ):
+                first = self.follower_client.get(
+                    reverse("posts:follow_index")
+                ).context["page_obj"]
+                second = self.follower_client.get(
+                    reverse("posts:follow_index"), {"after": first.next_cursor}
+                ).context["page_obj"]
+            with self.subTest(engine=engine):
+                self.assertEqual(
+                    [[post.pk for post in page] for page in (first, second)],
+                    feeds["join"],
+                )
@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment, Follow, Group, Post, User
+
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00"
+    b"\x01\x00\x00\x00\x00\x21\xf9\x04"
+    b"\x01\x0a\x00\x01\x00\x2c\x00\x00"
+    b"\x00\x00\x01\x00\x01\x00\x00\x02"
+    b"\x02\x4c\x01\x00\x3b"
+)
+
+
+def explain_query_plan(sql):
+    """Строки EXPLAIN QUERY PLAN для SQL-запроса SQLite."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(detail):
+    """Причина, по которой шаг плана считается медленным, или None."""
+    if "TEMP B-TREE" in detail:
+        return "сортировка во временном B-дереве"
+    if detail.startswith("SCAN ") and "INDEX" not in detail:
+        return "полный просмотр таблицы"
+    return None
+
+
+class QueryPlanMixin:
+    """Проверяет, что все SELECT-запросы запроса к view идут по индексам."""
+
+    def assertIndexedQueries(self, client, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT"):
+                continue
+            for detail in explain_query_plan(sql):
+                problem = plan_problems(detail)
+                self.assertIsNone(problem, f"{url}: {detail}\n{sql}")
+        return response
+
+
+def seed_data(posts=25, comments=3):
+    """Лента, похожая на живую: авторы, группа, подписка, картинки
+    и комментарии. Возвращает словарь созданных объектов."""
+    author = User.objects.create_user(username="author")
+    reader = User.objects.create_user(username="reader")
+    group = Group.objects.create(
+        title="Группа", slug="group", description="Описание"
+    )
+    Follow.objects.create(user=reader, author=author)
+    created = []
+    for number in range(posts):
+        image = None
+        if number % 2:
+            image = SimpleUploadedFile(
+                f"{number}.gif", SMALL_GIF, content_type="image/gif"
+            )
+        created.append(
+            Post.objects.create(
+                author=author if number % 3 else reader,
+                group=group if number % 2 else None,
+                text=f"Пост номер {number}",
+                image=image,
+            )
+        )
+    for post in created[:comments]:
+        for commenter in (author, reader):
+            Comment.objects.create(
+                post=post, author=commenter, text="Комментарий"
+            )
+    return {
+        "author": author,
+        "reader": reader,
+        "group": group,
+        "post": created[-1],
+    }
+
+
+class QueryBudgetMixin:
+    """Держит число SQL-запросов к URL в пределах бюджета.
+
+    Каждый URL запрашивается при нескольких размерах страницы с пустым
+    кешем, внутри точки сохранения, которая потом откатывается: так
+    запросы с побочными эффектами не влияют на следующие. Число
+    запросов не должно зависеть от размера страницы — иначе это N+1.
+    """
+
+    page_sizes = (2, 10)
+
+    def capture_queries(self, url, user=None, data=None):
+        cache.clear()
+        with transaction.atomic():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url, data)
+            transaction.set_rollback(True)
+        return response, context.captured_queries
+
+    def assertQueryBudget(self, url, budget, user=None, data=None):
+        counts = {}
+        for per_page in self.page_sizes:
+            with override_settings(POSTS_PER_PAGE=per_page):
+                response, queries = self.capture_queries(url, user, data)
+            counts[per_page] = len(queries)
+            self.assertLess(response.status_code, 400, url)
+            self.assertLessEqual(
+                len(queries),
+                budget,
+                f"{url}: {len(queries)} запросов при бюджете {budget}:\n"
+                + "\n".join(query["sql"] for query in queries),
+            )
+        self.assertEqual(
+            len(set(counts.values())),
+            1,
+            f"{url}: число запросов растёт с размером страницы: {counts}",
+        )
+        return counts[self.page_sizes[0]]
@@ -0,0 +1,154 @@
+import json
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .cache import bump_generation, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def generate_thumbnails(post_id):
+    """Готовит все миниатюры поста и помечает их готовыми.
+
+    Возвращает True, если пост с картинкой нашёлся и обработан.
+    """
+    post = (
+        Post.objects.select_related("author", "group")
+        .filter(pk=post_id)
+        .first()
+    )
+    if post is None or not post.image:
+        return False
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES.values():
+        try:
+            get_thumbnail(post.image, geometry, **options)
+        except Exception:
+            # Битая или пропавшая картинка не должна вечно висеть
+            # в очереди: страница покажет заглушку вместо миниатюры.
+            logger.exception("Не удалось сделать миниатюру поста %s", post_id)
+    variants = build_variants(post.image)
+    # Картинку могли заменить, пока шла обработка: тогда ждём своей задачи.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails_ready=True,
+        image_variants=json.dumps(variants) if variants else "",
+        updated_at=timezone.now(),
+    )
+    if updated:
+        bump_generation(*post_scopes(post))
+    return bool(updated)
+
+
+def build_variants(image):
+    """Готовит лестницу ширин IMAGE_VARIANT_WIDTHS во всех форматах.
+
+    Возвращает {"jpeg": [[имя файла, ширина], ...], ...}. Картинка не
+    растягивается, поэтому узкий оригинал даёт меньше ступеней.
+    """
+    ratio_width, ratio_height = settings.IMAGE_RATIO
+    variants = {}
+    for image_format in settings.IMAGE_VARIANT_FORMATS:
+        if image_format == "WEBP" and not features.check("webp"):
+            continue
+        ladder = {}
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            height = round(width * ratio_height / ratio_width)
+            try:
+                thumbnail = get_thumbnail(
+                    image,
+                    f"{width}x{height}",
+                    crop="center",
+                    upscale=False,
+                    format=image_format,
+                )
+            except Exception:
+                logger.exception("Не удалось сделать вариант %s", image)
+                continue
+            if thumbnail.exists():
+                ladder.setdefault(thumbnail.width, thumbnail.name)
+        if ladder:
+            variants[image_format.lower()] = [
+                [name, width] for width, name in sorted(ladder.items())
+            ]
+    return variants
+
+
+def thumbnail_file(image, geometry, options):
+    """Файл миниатюры, который выдал бы sorl, без обращения к хранилищу."""
+    # Повторяет подготовку параметров из ThumbnailBackend.get_thumbnail:
+    # имя миниатюры зависит от полного набора параметров.
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault("format", backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def _fetch_records(keys):
+    """Записи KV-хранилища sorl: один get_many и один запрос к базе."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(
+            KVStore.objects.filter(key__in=missing).values_list("key", "value")
+        )
+        # Как и sorl, запоминаем отсутствие записи, чтобы не ходить в базу.
+        kvstore.cache.set_many(
+            {key: rows.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        found.update(rows)
+    return {key: value for key, value in found.items() if value != EMPTY_VALUE}
+
+
+def attach_thumbnails(posts):
+    """Проставляет постам готовые миниатюры в `post.thumbnails`.
+
+    Аналог select_related для `{% thumbnail %}`: записи всех миниатюр
+    страницы читаются из KV-хранилища sorl одним запросом. Пока фоновая
+    обработка не закончилась, словарь остаётся пустым.
+    """
+    posts = list(posts)
+    wanted = []
+    for post in posts:
+        post.thumbnails = {}
+        if not post.image or not post.thumbnails_ready:
+            continue
+        for name, (geometry, options) in settings.THUMBNAIL_GEOMETRIES.items():
+            thumbnail = thumbnail_file(post.image, geometry, options)
+            wanted.append(
+                (add_prefix(thumbnail.key), post, name, geometry, options)
+            )
+    records = _fetch_records(list({key for key, *_ in wanted}))
+    for key, post, name, geometry, options in wanted:
+        if key in records:
+            post.thumbnails[name] = deserialize_image_file(records[key])
+        else:
+            # Запись пропала из хранилища: sorl восстановит её сам.
+            post.thumbnails[name] = get_thumbnail(
+                post.image, geometry, **options
+            )
+    return posts
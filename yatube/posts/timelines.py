@@ -0,0 +1,53 @@
+from itertools import islice
+
+from django.conf import settings
+
+from .models import Follow, Post, TimelineEntry
+
+
+def _bulk_insert(entries):
+    """Пишет записи ленты пачками, не держа их все в памяти."""
+    entries = iter(entries)
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам всех подписчиков автора."""
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            author_id=post.author_id,
+            post_id=post.pk,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту пользователя все посты автора."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        "pk", "pub_date"
+    )
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            author_id=author_id,
+            post_id=post_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
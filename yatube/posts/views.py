@@ -1,64 +1,127 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from .autocomplete import suggestions
+from .cache import cache_feed, feed_etag, post_etag, post_last_modified
+from .counters import get_profile
+from .feeds import (get_follow_cursor_keys, get_follow_feed, group_feed,
+                    index_feed, post_comments, profile_feed)
 from .forms import CommentForm, PostForm
+from .fragments import attach_articles
 from .models import Follow, Group, Post, User
-
-
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, 10)
+from .paginators import CursorPaginator, LazyCountPaginator
+from .search import search_page
+from .thumbnails import attach_thumbnails
+
+
+def get_page_context(
+    queryset, request, scope, cursor_keys=("pub_date", "pk")
+):
+    if settings.POSTS_PAGINATION == "cursor" and isinstance(
+        queryset, QuerySet
+    ):
+        paginator = CursorPaginator(
+            queryset, settings.POSTS_PER_PAGE, keys=cursor_keys
+        )
+        page_obj = paginator.get_page(
+            after=request.GET.get("after"), before=request.GET.get("before")
+        )
+        page_obj.object_list = attach_articles(page_obj.object_list)
+        return {
+            "paginator": paginator,
+            "page_number": None,
+            "page_obj": page_obj,
+        }
+    paginator = LazyCountPaginator(queryset, settings.POSTS_PER_PAGE, scope)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_articles(page_obj.object_list)
     return {
         "paginator": paginator,
         "page_number": page_number,
         "page_obj": page_obj,
+        "page_range": list(
+            paginator.get_elided_page_range(
+                page_obj.number,
+                on_each_side=settings.POSTS_PAGE_RANGE_ON_EACH_SIDE,
+                on_ends=settings.POSTS_PAGE_RANGE_ON_ENDS,
+            )
+        ),
     }
 
 
-@cache_page(20, key_prefix="index_page")
+@cache_feed("index")
 def index(request):
-    context = get_page_context(
-        Post.objects.select_related("author", "group"), request
-    )
+    context = get_page_context(index_feed(), request, "index")
     return render(request, "posts/index.html", context)
 
 
+@condition(etag_func=feed_etag(lambda slug: f"group:{slug}"))
+@cache_feed(lambda slug: f"group:{slug}")
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {
         "group": group,
     }
     context.update(
-        get_page_context(group.posts.select_related("author"), request)
+        get_page_context(group_feed(group), request, f"group:{slug}")
     )
     return render(request, "posts/group_list.html", context)
 
 
+@condition(etag_func=feed_etag(lambda username: f"profile:{username}"))
+@cache_feed(lambda username: f"profile:{username}", per_user=True)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related("group")
-    posts_count = posts.count()
+    author = get_object_or_404(
+        User.objects.select_related("profile"), username=username
+    )
+    profile = get_profile(author)
     following = (
         request.user.is_authenticated
         and author.following.filter(user=request.user).exists()
     )
     context = {
         "author": author,
-        "posts_count": posts_count,
+        "profile": profile,
+        "posts_count": profile.posts_count,
         "following": following,
     }
-    context.update(get_page_context(posts, request))
+    context.update(
+        get_page_context(profile_feed(author), request, f"profile:{username}")
+    )
     return render(request, "posts/profile.html", context)
 
 
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page_obj = search_page(query, request.GET.get("after"))
+    page_obj.object_list = attach_articles(page_obj.object_list)
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+    }
+    return render(request, "posts/search.html", context)
+
+
+def autocomplete(request):
+    return JsonResponse(
+        {"results": suggestions(request.GET.get("q", ""))}
+    )
+
+
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related("author__profile", "group"), pk=post_id
+    )
+    attach_thumbnails([post])
     author = post.author
-    posts_count = Post.objects.filter(author=author).count()
-    comments = post.comments.select_related("author")
+    posts_count = get_profile(author).posts_count
+    comments = post_comments(post)
     form = CommentForm()
     context = {
         "author": author,
@@ -93,7 +156,11 @@ def post_edit(request, post_id):
         request.POST or None, files=request.FILES or None, instance=post
     )
     if request.method == "POST" and form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if "image" in form.changed_data:
+            # Пост снова встаёт в очередь `generate_thumbnails --watch`.
+            post.thumbnails_ready = False
+        post.save()
         return redirect("posts:post_detail", post_id)
     context = {
         "form": form,
@@ -116,11 +183,15 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related("group")
     context = {}
-    context.update(get_page_context(posts, request))
+    context.update(
+        get_page_context(
+            get_follow_feed(request.user),
+            request,
+            f"follow:{request.user.pk}",
+            cursor_keys=get_follow_cursor_keys(),
+        )
+    )
     return render(request, "posts/follow.html", context)
 
 
@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = "xgsl)ui77=7oyo#umd=exmlirn1x8(3r_azkefr7294aj&a^$&"
@@ -11,9 +12,35 @@ ALLOWED_HOSTS = [
     "testserver",
 ]
 
+# Тесты идут без общего файла кеша разработчика.
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.modules
+
+# Процессы держат горячие ключи в памяти, а общую копию — в файле SQLite.
 CACHES = {
-    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    "default": {
+        "BACKEND": "core.cache.TwoTierCache",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "LOCAL_MAX_ENTRIES": 1000,
+            "LOCAL_TIMEOUT": 5,
+            "SYNC_INTERVAL": 1,
+        },
+    },
+    "shared": {
+        "BACKEND": "core.cache.SQLiteCache",
+        "LOCATION": os.path.join(BASE_DIR, "django_cache.sqlite3"),
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    },
 }
+if TESTING:
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    }
+
+# Тесты откатывают базу, а кеш очищает раннер.
+TEST_RUNNER = "core.runner.CacheResetRunner"
 
 INSTALLED_APPS = [
     "django.contrib.admin",
@@ -30,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -39,11 +67,15 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Счётчики запроса в заголовке Server-Timing; строка с ними же пишется
+# в логгер core.timing с уровнем INFO.
+SERVER_TIMING_HEADER = True
+
 ROOT_URLCONF = "yatube.urls"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.timing.TimedDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -105,5 +137,71 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
+POSTS_PER_PAGE = 10
+# "pages" — нумерованные страницы, "cursor" — keyset-пагинация по
+# (pub_date, id) с токенами ?after=/?before= и без COUNT(*).
+POSTS_PAGINATION = "pages"
+# Сколько номеров страниц показывать вокруг текущей и по краям ленты.
+POSTS_PAGE_RANGE_ON_EACH_SIDE = 2
+POSTS_PAGE_RANGE_ON_ENDS = 1
+# Сколько секунд число постов ленты для номеров страниц считается
+# свежим; устаревшее пересчитывается после ответа, а не до него.
+POSTS_COUNT_TIMEOUT = 60 * 10
+
+# Движок ленты подписок: "join" — запрос через Follow на каждый показ,
+# "timeline" — материализованная лента, заполняемая при публикации,
+# "merge" — слияние кешированных лент авторов (всегда с номерами страниц).
+FOLLOW_FEED_ENGINE = "timeline"
+TIMELINE_BATCH_SIZE = 1000
+# Сколько последних постов автора хранится в кеше для движка "merge".
+AUTHOR_TIMELINE_LENGTH = 500
+AUTHOR_TIMELINE_TIMEOUT = 60 * 60
+# Страницы лент сбрасываются сигналами, поэтому могут жить долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько ещё отдавать устаревшую страницу, пока её пересчитывает
+# один воркер, и на сколько он берёт блокировку пересчёта.
+FEED_CACHE_STALE_TIMEOUT = 60 * 10
+FEED_CACHE_LOCK_TIMEOUT = 30
+# Как часто процесс сбрасывает счётчики попаданий в общий кеш.
+FEED_CACHE_STATS_FLUSH_INTERVAL = 10
+# Фрагменты постов версионируются по содержимому и не требуют сброса.
+ARTICLE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Загрузки уменьшаются до IMAGE_MAX_SIDE по большей стороне, а картинки
+# больше IMAGE_MAX_PIXELS отклоняются до декодирования.
+IMAGE_MAX_SIDE = 2560
+IMAGE_MAX_PIXELS = 50 * 10 ** 6
+IMAGE_JPEG_QUALITY = 85
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Кто передаёт медиафайлы клиенту: None — сам Django через FileResponse,
+# "nginx" — X-Accel-Redirect на internal-локацию MEDIA_ACCEL_PREFIX,
+# "apache" — X-Sendfile с путём к файлу.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = "/protected-media/"
+
+# Миниатюры, которые готовятся сразу после загрузки картинки:
+# имя -> (геометрия, параметры sorl-thumbnail).
+THUMBNAIL_GEOMETRIES = {
+    "article": ("960x339", {"crop": "center", "upscale": True}),
+}
+# Лестница ширин для srcset: высота считается по пропорции IMAGE_RATIO,
+# форматы, которые не умеет кодировать Pillow, пропускаются.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1920)
+IMAGE_VARIANT_FORMATS = ("WEBP", "JPEG")
+IMAGE_RATIO = (960, 339)
+# Как часто `generate_thumbnails --watch` проверяет очередь постов.
+# Воркер запускается отдельным процессом рядом с веб-сервером (см.
+# README), иначе новые картинки так и останутся заглушками.
+THUMBNAIL_POLL_INTERVAL = 1
+
+# Поиск по постам: "fts5" — виртуальная таблица SQLite FTS5,
+# "inverted" — своя таблица обратного индекса, "auto" — FTS5, если есть.
+POSTS_SEARCH_BACKEND = "auto"
+POSTS_SEARCH_PER_PAGE = 10
+# Админка показывает только столько лучших по рангу совпадений: список
+# id уходит в `pk IN (...)`, а сама выдача отсортирована по рангу.
+POSTS_SEARCH_ADMIN_LIMIT = 1000
+# Сколько подсказок отдаёт автодополнение имён авторов и групп.
+AUTOCOMPLETE_LIMIT = 10